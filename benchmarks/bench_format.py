@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+"""Time formatting of a large script with a varying number of jobs.
+
+    ./benchmarks/bench_format.py --statements 5000 --jobs 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sql_parser import parse  # noqa: E402
+
+STATEMENT = '''
+INSERT INTO derived_{i} (a, b, c)
+SELECT t.a, CASE WHEN t.b > {i} THEN 'high' ELSE 'low' END AS b,
+       COALESCE(u.c, SomeFunction(t.a, t.b, 'constant_{i}')) AS c
+FROM source_{i} AS t
+LEFT JOIN dims AS u ON t.a = u.a AND t.b = u.b
+WHERE t.a IN (SELECT a FROM filter_{i}) AND t.b BETWEEN 1 AND {i};
+'''
+
+
+class NullOutput:
+    def write(self, s):
+        pass
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--statements', type=int, default=1000)
+    argparser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4])
+    args = argparser.parse_args()
+
+    parsed = parse(''.join(STATEMENT.format(i=i)
+                           for i in range(args.statements)))
+
+    # Speedups are relative to the first entry of --jobs.
+    base = None
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        parsed.write_sql(NullOutput(), jobs=jobs)
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        print('jobs={:<3} {:8.2f}s  speedup {:5.2f}x'.format(
+            jobs, elapsed, base / elapsed))
+
+if __name__ == '__main__':
+    main()
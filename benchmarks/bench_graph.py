@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+"""Time transitive reduction of synthetic dependency graphs.
+
+Compares sql_rewrite.graph.minimise_graph against the previous closure based
+implementation, which is only run up to --legacy_max nodes.
+
+    ./benchmarks/bench_graph.py --nodes 1000 10000 100000 --legacy_max 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sql_rewrite.graph import minimise_graph  # noqa: E402
+
+
+def legacy_minimise_graph(graph):
+    """The closure and pairwise subset implementation, kept for comparison."""
+
+    egraph = dict()
+
+    def expand_all_source(src):
+        if src in egraph:
+            return
+
+        dest_set = set()
+        egraph[src] = dest_set
+
+        if not src in graph:
+            return
+
+        for dest in graph[src]:
+            dest_set.add(dest)
+            expand_all_source(dest)
+            dest_set.update(egraph[dest])
+
+        dest_set.discard(src)
+
+    for src in graph:
+        expand_all_source(src)
+
+    mgraph = dict()
+    for src in egraph:
+        children = list(egraph[src])
+
+        i = 0
+        while i < len(children):
+            j = 0
+            while j < len(children):
+                if j != i:
+                    if (children[i] in egraph[children[j]] and
+                        egraph[children[i]].issubset(egraph[children[j]])):
+                        del children[i]
+                        i -= 1
+                        j = 0
+                        break
+                j += 1
+            i += 1
+
+        if children:
+            mgraph[src] = set(children)
+
+    return mgraph
+
+
+def make_graph(nodes, degree, window, cycles, seed):
+    """A warehouse shaped graph: each table reads from a few recent tables.
+
+    Tables depend on up to `degree` tables among the previous `window`; with
+    `cycles` a fraction of the edges point the other way.
+    """
+    rng = random.Random(seed)
+    graph = dict()
+    for i in range(1, nodes):
+        lo = max(0, i - window)
+        deps = {'t{}'.format(rng.randrange(lo, i))
+                for _ in range(rng.randint(1, degree))}
+        if cycles and rng.random() < cycles:
+            deps.add('t{}'.format(rng.randrange(i, min(nodes, i + window))))
+        graph['t{}'.format(i)] = deps
+    return graph
+
+
+def timed(fn, graph):
+    start = time.perf_counter()
+    result = fn(graph)
+    return result, time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--nodes', type=int, nargs='+',
+                           default=[1000, 10000, 100000])
+    argparser.add_argument('--degree', type=int, default=4)
+    argparser.add_argument('--window', type=int, default=200)
+    argparser.add_argument('--cycles', type=float, default=0.0,
+                           help='Fraction of tables with a back edge')
+    argparser.add_argument('--legacy_max', type=int, default=2000)
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    # The legacy implementation recurses once per level of the graph.
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * args.legacy_max))
+
+    for nodes in args.nodes:
+        graph = make_graph(nodes, args.degree, args.window, args.cycles,
+                           args.seed)
+        edges = sum(len(deps) for deps in graph.values())
+        reduced, elapsed = timed(minimise_graph, graph)
+        kept = sum(len(deps) for deps in reduced.values())
+        line = 'nodes={:<7} edges={:<7} kept={:<7} {:8.3f}s'.format(
+            nodes, edges, kept, elapsed)
+
+        if nodes <= args.legacy_max:
+            legacy, legacy_elapsed = timed(legacy_minimise_graph, graph)
+            line += '  legacy {:8.3f}s  speedup {:7.1f}x'.format(
+                legacy_elapsed, legacy_elapsed / elapsed)
+            if not args.cycles and legacy != reduced:
+                line += '  MISMATCH'
+        print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+#
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+"""Time dependency extraction over many files with a varying number of jobs.
+
+    ./benchmarks/bench_lineage.py --files 2000 --jobs 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sql_rewrite.extract import extract  # noqa: E402
+
+SCRIPT = '''
+CREATE TABLE stage_{i} AS
+SELECT t.a, t.b, COALESCE(u.c, 0) AS c
+FROM derived_{j} AS t
+LEFT JOIN dims AS u ON t.a = u.a
+WHERE t.b > {i};
+INSERT INTO derived_{i} (a, b, c)
+WITH x AS (SELECT a, b, c FROM stage_{i})
+SELECT x.a, x.b, SUM(x.c) FROM x GROUP BY x.a, x.b;
+'''
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--files', type=int, default=500)
+    argparser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4])
+    argparser.add_argument('--columns', action='store_true',
+                           help='Column rather than table dependencies')
+    args = argparser.parse_args()
+
+    sqls = [SCRIPT.format(i=i, j=i // 2) for i in range(args.files)]
+
+    for jobs in args.jobs:
+        start = time.perf_counter()
+        deps = extract(sqls, column_level=args.columns, jobs=jobs)
+        elapsed = time.perf_counter() - start
+        rate = args.files / elapsed
+        print('jobs={:<3} {:8.2f}s  {:8.1f} files/s  {:8.1f} files/s/core  '
+              '{} dependencies'.format(jobs, elapsed, rate,
+                                       rate / min(jobs, os.cpu_count()),
+                                       len(deps)))
+
+if __name__ == '__main__':
+    main()
@@ -16,8 +16,11 @@
 
 - Defines formatter-specific exception class.
 - Access to and manipulation of tool options.
+- Immutable formatting profiles, passed explicitly to the layout algorithm.
 """
 
+import collections
+
 
 class Error(Exception):
   """Base class for R formatter exceptions."""
@@ -54,18 +57,62 @@ class Options(object):
 
   def Check(self):
     """Assertion verification for options."""
-    try:
-      assert self.m0 >= 0, "margin0"
-      assert self.m1 >= self.m0, "margin1"
-      assert self.c0 >= 0, "cost0"
-      assert self.c1 >= 0, "cost1"
-      assert self.cb >= 0, "costb"
-      assert self.ind >= 0, "indent"
-      assert self.adj_comment >= 0, "adj_comment"
-      assert self.adj_flow >= 0, "adj_flow"
-      assert self.adj_call >= 0, "adj_call"
-      assert self.adj_arg >= 0, "adj_arg"
-      assert self.cpack >= 0, "cpack"
-    except AssertionError as e:
-      raise Error("Illegal option value for '%s'" % e.args[0])
+    _Check(self)
+
+  def Profile(self):
+    """An immutable Profile holding the current values of these options."""
+    return Profile(**{name: getattr(self, name) for name in Profile._fields
+                      if hasattr(self, name)})
+
+
+def _Check(opts):
+  """Assertion verification for a set of options (Options or Profile)."""
+  try:
+    assert opts.m0 >= 0, "margin0"
+    assert opts.m1 >= opts.m0, "margin1"
+    assert opts.c0 >= 0, "cost0"
+    assert opts.c1 >= 0, "cost1"
+    assert opts.cb >= 0, "costb"
+    assert opts.ind >= 0, "indent"
+    assert opts.adj_comment >= 0, "adj_comment"
+    assert opts.adj_flow >= 0, "adj_flow"
+    assert opts.adj_call >= 0, "adj_call"
+    assert opts.adj_arg >= 0, "adj_arg"
+    assert opts.cpack >= 0, "cpack"
+    for limit in ('max_knots', 'max_visits', 'max_seconds'):
+      value = getattr(opts, limit, None)
+      assert value is None or value >= 0, limit
+  except AssertionError as e:
+    raise Error("Illegal option value for '%s'" % e.args[0])
+
+
+class Profile(collections.namedtuple('Profile', [
+    'm0', 'm1', 'c0', 'c1', 'cb', 'ind', 'adj_comment', 'adj_flow',
+    'adj_call', 'adj_arg', 'cpack', 'format_policy', 'max_knots',
+    'max_visits', 'max_seconds'])):
+  """Immutable set of options for the formatter.
+
+  A Profile is passed explicitly through the layout algorithm rather than read
+  from global state, so any number of profiles may be used concurrently, e.g.
+  by several threads formatting with different widths.
+
+  The max_* options bound the effort spent laying out a block tree (see
+  support.Budget); None means unlimited.
+  """
+
+  __slots__ = ()
+
+  def __new__(cls, m0=0, m1=80, c0=.05, c1=100, cb=2, ind=2, adj_comment=.5,
+              adj_flow=.3, adj_call=.5, adj_arg=5, cpack=1e-3,
+              format_policy=None, max_knots=None, max_visits=None,
+              max_seconds=None):
+    profile = super(Profile, cls).__new__(cls, m0, m1, c0, c1, cb, ind,
+                                          adj_comment, adj_flow, adj_call,
+                                          adj_arg, cpack, format_policy,
+                                          max_knots, max_visits, max_seconds)
+    _Check(profile)
+    return profile
 
+  def Replace(self, **opts):
+    """A new Profile with the given options replaced."""
+    return Profile(**dict(self._asdict(), **opts))
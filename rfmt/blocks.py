@@ -18,8 +18,6 @@ from . import base
 from . import support
 import re
 
-_options = base.Options()  # Shorthand for convenient access
-
 
 class LayoutBlock(object):
   """The abstract class at base of the block hierarchy."""
@@ -27,8 +25,10 @@ class LayoutBlock(object):
   def __init__(self, is_breaking=False):
     # If a newline is mandated after this block.
     self.is_breaking = is_breaking
-    # See OptLayout method below for use of layout_cache.
+    # See OptLayout method below for use of the layout_* attributes.
     self.layout_cache = {}
+    self.layout_profile = None
+    self.layout_budget = None
 
   def Parms(self):
     """A dictionary containing the parameters of this block."""
@@ -44,29 +44,41 @@ class LayoutBlock(object):
     return re.sub('[a-z]', '', self.__class__.__name__ +
                   '*' * self.is_breaking) + self.ReprParms()
 
-  def OptLayout(self, rest_of_line):
+  def OptLayout(self, rest_of_line, profile, budget=None):
     """Retrieve or compute the least-cost (optimum) layout for this block.
 
     Args:
       rest_of_line: a Solution object representing the text to the right of
         this block.
+      profile: the base.Profile holding the formatting options.
+      budget: an optional support.Budget limiting the layout effort.
     Returns:
       A Solution object representing the optimal layout for this block and
       the rest of the line.
     """
     # Deeply-nested choice block may result in the same continuation supplied
     # repeatedly to the same block. Without memoisation, this may result in an
-    # exponential blow-up in the layout algorithm.
+    # exponential blow-up in the layout algorithm. The memoised solutions are
+    # only valid for the profile and budget they were computed with.
+    if profile is not self.layout_profile or budget is not self.layout_budget:
+      self.layout_cache = {}
+      self.layout_profile = profile
+      self.layout_budget = budget
     if rest_of_line not in self.layout_cache:
-      self.layout_cache[rest_of_line] = self.DoOptLayout(rest_of_line)
+      if budget is not None:
+        budget.Visit()
+      self.layout_cache[rest_of_line] = self.DoOptLayout(rest_of_line, profile,
+                                                         budget)
     return self.layout_cache[rest_of_line]
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     """Compute the least-cost (optimum) layout for this block.
 
     Args:
       rest_of_line: a Solution object representing the text to the right of
         this block.
+      profile: the base.Profile holding the formatting options.
+      budget: a support.Budget limiting the layout effort, or None.
     Returns:
       A Solution object representing the optimal layout for this block and
       the rest of the line.
@@ -74,14 +86,50 @@ class LayoutBlock(object):
     # Abstract method.
     pass
 
-  def PrintOn(self, outp):
+  def PrintOn(self, outp, profile):
     """Print the contents of this block with the optimal layout.
 
     Args:
       outp: a stream on which output is to be printed.
+      profile: the base.Profile holding the formatting options.
+    Returns:
+      True if the profile's layout budget was exceeded, in which case parts of
+      the layout fell back to their compact alternatives.
+    """
+    budget = support.MkBudget(profile)
+    soln = self.OptLayout(None, profile, budget)
+    console = support.Console(outp, profile)
+    console.PrintLayout(soln.layouts[0])
+    console.Flush()
+    return budget is not None and budget.exceeded
+
+  def PrintOnWidths(self, outps, profile):
+    """Print the optimal layout for several widths from a single solve.
+
+    The Solution for this block maps every starting margin to its optimal
+    layout. Starting at margin m1 - w leaves w characters before the right
+    margin, so the layout chosen there is the one for a width of w. Note that
+    the soft margin cost is still charged from m0 rather than from the shifted
+    margin, which mildly favours fewer lines for widths narrower than m1.
+
+    Args:
+      outps: a dictionary mapping each width (at most profile.m1) to the
+        stream on which the layout for that width is to be printed.
+      profile: the base.Profile holding the formatting options.
+    Returns:
+      True if the profile's layout budget was exceeded (see PrintOn).
     """
-    soln = self.OptLayout(None)
-    support.Console(outp).PrintLayout(soln.layouts[0])
+    budget = support.MkBudget(profile)
+    soln = self.OptLayout(None, profile, budget)
+    for width, outp in outps.items():
+      if not 0 < width <= profile.m1:
+        raise base.Error('Width %d outside of (0, m1]' % width)
+      soln.Reset()
+      soln.MoveToMargin(profile.m1 - width)
+      console = support.Console(outp, profile)
+      console.PrintLayout(soln.CurLayout())
+      console.Flush()
+    return budget is not None and budget.exceeded
 
 
 class TextBlock(LayoutBlock):
@@ -94,31 +142,31 @@ class TextBlock(LayoutBlock):
   def __repr__(self):
     return '*' * self.is_breaking + self.text
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     span = len(self.text)
     layout = support.Layout([support.LayoutElement.String(self.text)])
     # The costs associated with the layout of this block may require 1, 2 or 3
     # knots, depending on how the length of the text compares with the two
-    # margins (m0 and m1) in _options. Note that we assume
-    # _options.m1 >= _options.m0 >= 0, as asserted in base.Options.Check().
-    if span >= _options.m1:
+    # margins (m0 and m1) in the profile. Note that we assume
+    # profile.m1 >= profile.m0 >= 0, as asserted in base.Profile.
+    if span >= profile.m1:
       s = support.Solution([0], [span],
-                           [(span - _options.m0) * _options.c0 +
-                            (span - _options.m1) * _options.m1],
-                           [_options.c0 + _options.c1], [layout])
-    elif span >= _options.m0:
-      s = support.Solution([0, _options.m1 - span], [span] * 2,
-                           [(span - _options.m0) * _options.c0,
-                            (_options.m1 - _options.m0) * _options.c0],
-                           [_options.c0, _options.c0 + _options.c1],
+                           [(span - profile.m0) * profile.c0 +
+                            (span - profile.m1) * profile.m1],
+                           [profile.c0 + profile.c1], [layout])
+    elif span >= profile.m0:
+      s = support.Solution([0, profile.m1 - span], [span] * 2,
+                           [(span - profile.m0) * profile.c0,
+                            (profile.m1 - profile.m0) * profile.c0],
+                           [profile.c0, profile.c0 + profile.c1],
                            [layout] * 2)
     else:
-      s = support.Solution([0, _options.m0 - span, _options.m1 - span],
+      s = support.Solution([0, profile.m0 - span, profile.m1 - span],
                            [span] * 3,
-                           [0, 0, (_options.m1 - _options.m0) * _options.c0],
-                           [0, _options.c0, _options.c0 + _options.c1],
+                           [0, 0, (profile.m1 - profile.m0) * profile.c0],
+                           [0, profile.c0, profile.c0 + profile.c1],
                            [layout] * 3)
-    return s.WithRestOfLine(rest_of_line)
+    return s.WithRestOfLine(rest_of_line, profile)
 
 
 class CompositeLayoutBlock(LayoutBlock):
@@ -146,7 +194,7 @@ class LineBlock(CompositeLayoutBlock):
   def __init__(self, elements):
     super(LineBlock, self).__init__(elements)
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     if not self.elements: return rest_of_line
     element_lines = [[]]
     for i, elt in enumerate(self.elements):
@@ -154,35 +202,58 @@ class LineBlock(CompositeLayoutBlock):
       if i < len(self.elements) - 1 and elt.is_breaking:
         element_lines.append([])
     if len(element_lines) > 1:
-      element_lines = _options.format_policy.BreakElementLines(element_lines)
+      element_lines = profile.format_policy.BreakElementLines(element_lines)
     line_solns = []
     for i, ln in enumerate(element_lines):
       ln_layout = None if i < len(element_lines) - 1 else rest_of_line
       for elt in ln[::-1]:
-        ln_layout = elt.OptLayout(ln_layout)
+        ln_layout = elt.OptLayout(ln_layout, profile, budget)
       line_solns.append(ln_layout)
     soln = support.VSumSolution(line_solns)
-    return soln.PlusConst(_options.cb * (len(line_solns) - 1))
+    return soln.PlusConst(profile.cb * (len(line_solns) - 1))
 
 
-def IndentBlock(element, indent=None):
-  """Return a block that contains another block, indented by a given amount."""
-  if indent is None: indent = _options.ind
-  return LineBlock([TextBlock(' ' * indent), element])
+class IndentBlock(CompositeLayoutBlock):
+  """A block that contains another block, indented by a given amount.
+
+  If no indent is given, the profile's indent (ind) is used when the block is
+  laid out.
+  """
+
+  def __init__(self, element, indent=None):
+    super(IndentBlock, self).__init__([element])
+    self.indent = indent
+
+  def DoOptLayout(self, rest_of_line, profile, budget):
+    indent = profile.ind if self.indent is None else self.indent
+    return TextBlock(' ' * indent).OptLayout(
+        self.elements[0].OptLayout(rest_of_line, profile, budget), profile,
+        budget)
 
 
 class ChoiceBlock(CompositeLayoutBlock):
-  """A block which contains alternate layouts of the same content."""
+  """A block which contains alternate layouts of the same content.
+
+  The element at index fallback (normally the most compact alternative) is
+  the only one laid out once the layout budget has been exceeded.
+  """
 
   # Note: All elements of a ChoiceBlock are breaking, if any are.
-  def __init__(self, elements):
+  def __init__(self, elements, fallback=0):
     super(ChoiceBlock, self).__init__(elements)
+    self.fallback = fallback
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
+    fallback = self.elements[self.fallback]
+    if budget is not None and budget.exceeded:
+      return fallback.OptLayout(rest_of_line, profile, budget)
     # The optimum layout of this block is simply the piecewise minimum of its
     # elements' layouts.
-    return support.MinSolution([e.OptLayout(rest_of_line)
+    soln = support.MinSolution([e.OptLayout(rest_of_line, profile, budget)
                                 for e in self.elements])
+    if budget is not None and budget.CheckKnots(soln):
+      return fallback.OptLayout(rest_of_line, profile, budget)
+    return soln
 
 
 class MultBreakBlock(CompositeLayoutBlock):
@@ -203,26 +274,30 @@ class StackBlock(MultBreakBlock):
   def __init__(self, elements, break_mult=1):
     super(StackBlock, self).__init__(elements, break_mult)
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     # The optimum layout for this block arranges the elements vertically. Only
     # the final element is composed with the continuation provided---all the
     # others see an empty continuation ("None"), since they face the end of
     # a line.
     if not self.elements: return rest_of_line
-    soln = support.VSumSolution([e.OptLayout(None)
+    soln = support.VSumSolution([e.OptLayout(None, profile, budget)
                                  for e in self.elements[:-1]] +
-                                [self.elements[-1].OptLayout(rest_of_line)])
+                                [self.elements[-1].OptLayout(rest_of_line,
+                                                             profile, budget)])
     # Under some odd circumstances involving comments, we may have a degenerate
     # solution.
     if soln is None:
       return rest_of_line
     # Add the cost of the line breaks between the elements.
-    return soln.PlusConst(_options.cb * self.break_mult *
+    return soln.PlusConst(profile.cb * self.break_mult *
                           max(len(self.elements) - 1, 0))
 
 
 class WrapBlock(MultBreakBlock):
-  """A block that arranges its elements like a justified paragraph."""
+  """A block that arranges its elements like a justified paragraph.
+
+  A break_mult of None uses the profile's comment adjustment (adj_comment).
+  """
 
   def __init__(self, elements, sep=' ', break_mult=1, prefix=None):
     super(WrapBlock, self).__init__(elements)
@@ -237,14 +312,17 @@ class WrapBlock(MultBreakBlock):
                 [('sep', self.sep)] +
                 (self.prefix is not None) * [('prefix', self.prefix)])
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     # Computing the optimum layout for this class of block involves finding the
     # optimal packing of elements into lines, a problem which we address using
     # dynamic programming.
-    sep_layout = TextBlock(self.sep).OptLayout(None)
+    break_mult = (profile.adj_comment if self.break_mult is None
+                  else self.break_mult)
+    sep_layout = TextBlock(self.sep).OptLayout(None, profile, budget)
     # TODO(pyelland): Investigate why OptLayout doesn't work here.
-    prefix_layout = self.prefix and TextBlock(self.prefix).DoOptLayout(None)
-    elt_layouts = [e.OptLayout(None) for e in self.elements]
+    prefix_layout = self.prefix and TextBlock(self.prefix).DoOptLayout(
+        None, profile, budget)
+    elt_layouts = [e.OptLayout(None, profile, budget) for e in self.elements]
     # Entry i in the list wrap_solutions contains the optimum layout for the
     # last n - i elements of the block.
     wrap_solutions = [None] * self.n
@@ -268,26 +346,26 @@ class WrapBlock(MultBreakBlock):
       if prefix_layout is None:
         line_layout = elt_layouts[i]
       else:
-        line_layout = prefix_layout.WithRestOfLine(elt_layouts[i])
+        line_layout = prefix_layout.WithRestOfLine(elt_layouts[i], profile)
       last_breaking = self.elements[i].is_breaking
       for j in range(i, self.n - 1):
         full_soln = support.VSumSolution([line_layout, wrap_solutions[j + 1]])
         # We adjust the cost of the full solution by adding the cost of the
-        # line break we've introduced, and a small penalty (_options.cpack) to
+        # line break we've introduced, and a small penalty (profile.cpack) to
         # favor (ceteris paribus) layouts with elements packed into earlier
         # lines.
-        solutions_i.append(full_soln.PlusConst(_options.cb * self.break_mult +
-                                               _options.cpack * (self.n - j)))
+        solutions_i.append(full_soln.PlusConst(profile.cb * break_mult +
+                                               profile.cpack * (self.n - j)))
         # If the element at the end of the line mandates a following line break,
         # we're done.
         if last_breaking: break
         # Otherwise, add a separator and the next element to the line layout
         # and continue.
-        sep_elt_layout = sep_layout.WithRestOfLine(elt_layouts[j + 1])
-        line_layout = line_layout.WithRestOfLine(sep_elt_layout)
+        sep_elt_layout = sep_layout.WithRestOfLine(elt_layouts[j + 1], profile)
+        line_layout = line_layout.WithRestOfLine(sep_elt_layout, profile)
         last_breaking = self.elements[j + 1].is_breaking
       else:  # Not executed if last_breaking
-        solutions_i.append(line_layout.WithRestOfLine(rest_of_line))
+        solutions_i.append(line_layout.WithRestOfLine(rest_of_line, profile))
       wrap_solutions[i] = support.MinSolution(solutions_i)
     # Once wrap_solutions is complete, the optimum layout for the entire block
     # is the optimum layout for the last n - 0 elements.
@@ -305,7 +383,7 @@ class VerbBlock(LayoutBlock):
   def __repr__(self):
     return self.lines[0][:3] + '...' + self.lines[-1][-3:]
 
-  def DoOptLayout(self, rest_of_line):
+  def DoOptLayout(self, rest_of_line, profile, budget):
     # The solution for this block is essentially that of a TextBlock(''), with
     # an abberant layout calculated as follows.
     l_elts = []
@@ -316,13 +394,13 @@ class VerbBlock(LayoutBlock):
     layout = support.Layout(l_elts)
     span = 0
     sf = support.SolutionFactory()
-    if _options.m0 > 0:  # Prevent incoherent solutions
+    if profile.m0 > 0:  # Prevent incoherent solutions
       sf.Append(0, span, 0, 0, layout)
-    # _options.m1 == 0 is absurd
-    sf.Append(_options.m0 - span, span, 0, _options.c0, layout)
-    sf.Append(_options.m1 - span, span,
-              (_options.m1 - _options.m0) * _options.c0,
-              _options.c0 + _options.c1, layout)
+    # profile.m1 == 0 is absurd
+    sf.Append(profile.m0 - span, span, 0, profile.c0, layout)
+    sf.Append(profile.m1 - span, span,
+              (profile.m1 - profile.m0) * profile.c0,
+              profile.c0 + profile.c1, layout)
     return sf.MkSolution()
 
 
@@ -333,7 +411,7 @@ def LineCommentBlock(comments):
     block = IndentBlock(TextBlock('#'))
   else:
     block = IndentBlock(WrapBlock(map(TextBlock, inl_words),
-                                  break_mult=_options.adj_comment, prefix='# '))
+                                  break_mult=None, prefix='# '))
   block.is_breaking = True
   return block
 
@@ -14,11 +14,9 @@
 
 """Supporting infrastructure for the block language."""
 
-from . import base
 from builtins import str
 import math
-
-options = base.Options()  # Shorthand for convenient access
+import time
 
 
 # Shorthand constant, used to denote the "virtual" knot at infinity after the
@@ -28,14 +26,23 @@ INFINITY = float('inf')
 
 
 class Console(object):
-  """An object that mediates textual output of a code layout."""
+  """An object that mediates textual output of a code layout.
+
+  Output is buffered a line at a time: trailing spaces are dropped as each line
+  is completed, and completed lines are written to the output stream in chunks
+  of at least chunk_size characters. Flush() writes any remaining output.
+  """
 
-  def __init__(self, outp):
-    self._m0 = options.m0
-    self._m1 = options.m1
+  def __init__(self, outp, profile, chunk_size=1 << 16):
+    self._m0 = profile.m0
+    self._m1 = profile.m1
     self._h_pos = 0
     self._margins = []
     self._outp = outp
+    self._chunk_size = chunk_size
+    self._line = []
+    self._chunk = []
+    self._chunk_len = 0
 
   @property
   def margin(self):
@@ -54,10 +61,36 @@ class Console(object):
 
     Args:
       s: the string to be written. It is assumed that s contains no
-        newline characters.
+        newline characters, though any that occur (e.g. in verbatim string
+        literals) still complete the line.
     """
-    self._outp.write(str(s))
+    s = str(s)
     self._h_pos += len(s)
+    if '\n' in s:
+      lines = s.split('\n')
+      for ln in lines[:-1]:
+        self._line.append(ln)
+        self._EndLine()
+      s = lines[-1]
+    self._line.append(s)
+
+  def _EndLine(self, end='\n'):
+    """Complete the current line, without its trailing spaces."""
+    line = ''.join(self._line).rstrip(' ') + end
+    self._line = []
+    self._chunk.append(line)
+    self._chunk_len += len(line)
+    if self._chunk_len >= self._chunk_size:
+      self._outp.write(''.join(self._chunk))
+      self._chunk = []
+      self._chunk_len = 0
+
+  def Flush(self):
+    """Write the last (incomplete) line and any buffered output."""
+    self._EndLine(end='')
+    self._outp.write(''.join(self._chunk))
+    self._chunk = []
+    self._chunk_len = 0
 
   def Space(self, n):
     """Write a string of spaces on the console.
@@ -73,7 +106,7 @@ class Console(object):
     Args:
       indent: whether to preserve the current margin after the new line.
     """
-    self.String('\n')
+    self._EndLine()
     self._h_pos = 0
     if indent:
       self.Space(self.margin)
@@ -99,6 +132,46 @@ class Console(object):
     self._margins.pop()
 
 
+class Budget(object):
+  """The layout effort allowed for one block tree, from a profile's limits.
+
+  Visits are counted for each block layout that is computed (memoised layouts
+  are free). The budget is exceeded once there are more than max_visits
+  visits, max_seconds have elapsed, or a ChoiceBlock solution has more than
+  max_knots knots; ChoiceBlocks then only lay out their fallback alternative.
+  """
+
+  def __init__(self, profile):
+    self.max_knots = profile.max_knots
+    self.max_visits = profile.max_visits
+    self.deadline = (None if profile.max_seconds is None
+                     else time.monotonic() + profile.max_seconds)
+    self.visits = 0
+    self.exceeded = False
+
+  def Visit(self):
+    """Count the computation of a block layout."""
+    self.visits += 1
+    if ((self.max_visits is not None and self.visits > self.max_visits) or
+        (self.deadline is not None and time.monotonic() > self.deadline)):
+      self.exceeded = True
+
+  def CheckKnots(self, soln):
+    """Whether soln has too many knots, marking the budget exceeded if so."""
+    if self.max_knots is not None and len(soln.knots) > self.max_knots:
+      self.exceeded = True
+      return True
+    return False
+
+
+def MkBudget(profile):
+  """A new Budget for the profile's limits, or None if it sets no limits."""
+  if (profile.max_knots is None and profile.max_visits is None and
+      profile.max_seconds is None):
+    return None
+  return Budget(profile)
+
+
 class PrintDescriptionConsole(object):
   """A console that produces a description of the output.
 
@@ -299,17 +372,20 @@ class Solution(object):
                           [a + const for a in self.intercepts],
                           self.gradients, self.layouts)
 
-  def WithRestOfLine(self, rest_of_line):
+  def WithRestOfLine(self, rest_of_line, profile):
     """Return a Solution that joins the rest of the line right of this one.
 
     Args:
       rest_of_line: a Solution object representing the code laid out on the
         remainder of the line, or None, if the rest of the line is empty.
+      profile: the base.Profile holding the formatting options.
     Returns:
       A new Solution object juxtaposing the layout represented by this
       Solution to the immediate right of the remainder of the line.
     """
-    return self if rest_of_line is None else HPlusSolution(self, rest_of_line)
+    if rest_of_line is None:
+      return self
+    return HPlusSolution(self, rest_of_line, profile)
 
 
 class SolutionFactory(object):
@@ -342,12 +418,13 @@ class SolutionFactory(object):
     return Solution(*zip(*self.entries))
 
 
-def HPlusSolution(s1, s2):
+def HPlusSolution(s1, s2, profile):
   """The Solution that results from joining two Solutions side-by-side.
 
   Args:
     s1: Solution object
     s2: Solution object
+    profile: the base.Profile holding the margins and costs.
   Returns:
     A new Solution reflecting a layout in which s2 ('s layout) is placed
     immediately to the right of s1.
@@ -372,14 +449,14 @@ def HPlusSolution(s1, s2):
     # attributable to its projection beyond the margins.
     g1 = s1.CurGradient()
     g2 = s2.CurGradient()
-    overhang0 = s2_margin - options.m0  # s2_margin = m1 + span of s1
-    overhang1 = s2_margin - options.m1  # s2_margin = m1 + span of s1
+    overhang0 = s2_margin - profile.m0  # s2_margin = m1 + span of s1
+    overhang1 = s2_margin - profile.m1  # s2_margin = m1 + span of s1
     g_cur = (g1 + g2 -
-             options.c0 * (overhang0 >= 0) -
-             options.c1 * (overhang1 >= 0))
+             profile.c0 * (overhang0 >= 0) -
+             profile.c1 * (overhang1 >= 0))
     i_cur = (s1.CurValueAt(s1_margin) + s2.CurValueAt(s2_margin) -
-             options.c0 * max(overhang0, 0) -
-             options.c1 * max(overhang1, 0))
+             profile.c0 * max(overhang0, 0) -
+             profile.c1 * max(overhang1, 0))
     # The Layout computed by the following implicitly sets the margin
     # for s2 at the end of the last line printed for s1.
     col.Append(s1_margin, s1.CurSpan() + s2.CurSpan(), i_cur, g_cur,
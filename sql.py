@@ -17,12 +17,28 @@
 
 
 import argparse
+import dataclasses
+import os
 import sys
 import json
+import time
 
 from sql_parser import parse
-from sql_rewrite import convert, tables, tables_to_graph, MODES
-from sql_refactor import Refactor
+from sql_parser.node import PROFILE, SQLNodeList
+from sql_rewrite import convert, tables, tables_to_graph, find_cycles, MODES
+from sql_rewrite.stats import statement_tables
+from sql_rewrite.plan import plan_to_json
+from sql_rewrite.columns import columns
+from sql_rewrite.prune import liveness
+from sql_rewrite.export import EXPORTERS
+from sql_rewrite.extract import extract
+from sql_rewrite.duplicates import queries, find_duplicates
+from sql_rewrite.store import LineageStore, digest
+from sql_refactor.batch import (refactor_all, refactor_to, impact_all,
+                                impact_report)
+from sql_refactor.cache import RefactorCache
+from sql_refactor.knowledge import (compile_knowledge, load_knowledge,
+                                    KnowledgeError)
 
 # Define command line arguments
 argparser = argparse.ArgumentParser(description='Process SQL')
@@ -30,66 +46,312 @@ argparser.add_argument('--convert',
                        help='Convert', type=str, choices=MODES)
 argparser.add_argument('--type',
                        default='format',
-                       choices=['graph', 'tree', 'format'],
-                       help='Output type')
+                       choices=['graph', 'columns', 'cycles', 'plan', 'duplicates',
+                                'tree', 'format', 'impact'],
+                       help='Output type (impact: the changes --refactor '
+                            'would make, as JSON)')
 argparser.add_argument('--graph_minimise',
                        help='Minimise the graph', action='store_true')
+argparser.add_argument('--graph_format',
+                       default='dot', choices=sorted(EXPORTERS),
+                       help='Graph output format (default dot)')
 argparser.add_argument('--compact',
                        help='Compact formatted SQL', action='store_true')
 argparser.add_argument('--output',
                        type=argparse.FileType('w'), nargs='?', default=sys.stdout,
                        help='SQL Output (default stdout)')
 argparser.add_argument('sql_input',
-                       type=argparse.FileType('r'), nargs='+', default=sys.stdin,
+                       type=argparse.FileType('r'), nargs='*', default=[],
                        help='SQL Input')
 argparser.add_argument('--refactor',
                        help='Refactor', action='store_true')
+argparser.add_argument('--prune_wildcards',
+                       help='Expand SELECT * in CTEs and subqueries to the '
+                            'columns read from them', action='store_true')
+argparser.add_argument('--refactor_cache',
+                       type=str, default=None,
+                       help='SQLite cache of refactored statements')
 argparser.add_argument('--map_knowledge',
-                       type=argparse.FileType('r'), nargs='+', default=sys.stdin,
-                       help='Map Knowledge')
+                       type=str, nargs='+', default=None,
+                       help='Map Knowledge (JSON or compiled)')
+argparser.add_argument('--compile_knowledge',
+                       type=str, default=None,
+                       help='Validate --map_knowledge and write it compiled '
+                            'to this file')
+argparser.add_argument('--max_layout_seconds',
+                       type=float, default=None,
+                       help='Time budget for laying out each statement')
+argparser.add_argument('--jobs',
+                       type=int, default=1,
+                       help='Number of worker processes (default 1)')
+argparser.add_argument('--lineage_db',
+                       type=str, default=None,
+                       help='SQLite lineage store, updated from the inputs')
+argparser.add_argument('--upstream',
+                       type=str, default=None,
+                       help='List the tables a table is derived from')
+argparser.add_argument('--downstream',
+                       type=str, default=None,
+                       help='List the tables derived from a table')
+argparser.add_argument('--prune',
+                       help='Drop statements that only write unused tables',
+                       action='store_true')
+argparser.add_argument('--publish',
+                       type=str, action='append', default=None,
+                       help='Table (or glob pattern) used outside the '
+                            'inputs, kept by --prune; may be repeated')
+argparser.add_argument('--output_dir',
+                       type=str, default=None,
+                       help='Directory for the pruned scripts, one file per '
+                            'input (may be the input directory)')
 
-# Parse arguments
-args = argparser.parse_args()
+def lineage(args):
+    store = LineageStore(args.lineage_db)
 
-dep_tables = set()
+    # Only files that changed since the last run are parsed
+    inputs = set()
+    for sql_input in args.sql_input:
+        path = os.path.abspath(sql_input.name)
+        inputs.add(path)
+        text = sql_input.read()
+        # Converted with another --convert, the dependencies may differ
+        file_digest = digest(text if not args.convert
+                             else args.convert + '\n' + text)
+        if not store.is_current(path, file_digest):
+            parsed = parse(text)
+            if args.convert:
+                parsed = convert(args.convert, parsed)
+            store.update(path, file_digest, tables(parsed))
 
-for sql_input in args.sql_input:
+    # Files that were deleted, or are no longer part of the inputs
+    for path in store.paths():
+        if (inputs and path not in inputs) or not os.path.exists(path):
+            store.remove(path)
+
+    if args.upstream:
+        for table in store.upstream(args.upstream):
+            args.output.write(table + '\n')
+    if args.downstream:
+        for table in store.downstream(args.downstream):
+            args.output.write(table + '\n')
+
+    dep_tables = store.dependencies()
+    store.close()
+    return dep_tables
+
+
+def prune(args, profile):
+    # Liveness is decided across all of the inputs together
+    scripts = []
+    deps = []
+    for sql_input in args.sql_input:
+        parsed = parse(sql_input.read())
+        if args.convert:
+            parsed = convert(args.convert, parsed)
+        scripts.append((sql_input.name, parsed))
+        deps.extend(statement_tables(parsed))
+
+    result = liveness(deps, args.publish or ())
+    for table in result.dead_tables:
+        sys.stderr.write('{}: {}\n'.format(
+            'unread table' if table in result.unread else 'dead table',
+            table))
+
+    # Each script is written to the same path under --output_dir as it has
+    # under the directory the inputs share
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(name))
+                               for name, _ in scripts])
+    dead = set(result.dead_statements)
+    i = 0
+    for name, parsed in scripts:
+        commands = []
+        for j, cmd in enumerate(parsed.commands):
+            if i in dead:
+                sys.stderr.write('{}:{}: statement removed\n'.format(
+                    name, j + 1))
+            else:
+                commands.append(cmd)
+            i += 1
+        parsed = dataclasses.replace(parsed, commands=SQLNodeList(commands))
+        path = os.path.join(args.output_dir,
+                            os.path.relpath(os.path.abspath(name), base))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as outp:
+            # Separated like the output of --refactor, so the script runs
+            parsed.write_sql(outp, args.compact, profile, jobs=args.jobs,
+                             separator='\n;\n\n')
+            outp.write('\n')
+
+
+def main(args):
+    dep_tables = set()
+    statements = []
+    labels = []
+    found = []
+    profile = PROFILE.Replace(max_seconds=args.max_layout_seconds)
+
+    if args.prune:
+        prune(args, profile)
+        return
+
+    # Knowledge is loaded once, however many files are refactored
+    knowledge = None
+    if args.refactor or args.compile_knowledge:
+        try:
+            knowledge = load_knowledge(args.map_knowledge[0])
+        except KnowledgeError as e:
+            sys.exit(str(e))
+    if args.compile_knowledge:
+        compile_knowledge(dict(knowledge), args.compile_knowledge)
+        return
+
+    # The lineage store answers the graph queries without reparsing
+    if args.lineage_db:
+        dep_tables = lineage(args)
+        if args.type not in ('graph', 'cycles'):
+            return
+        args.sql_input = []
+
+    # Dependencies only -- the inputs can be parsed in parallel
+    if (args.jobs > 1 and args.sql_input and not args.refactor and
+            args.type in ('graph', 'columns', 'cycles')):
+        start = time.perf_counter()
+        dep_tables.update(extract(
+            (sql_input.read() for sql_input in args.sql_input),
+            args.convert, args.type == 'columns', args.jobs))
+        elapsed = time.perf_counter() - start
+        rate = len(args.sql_input) / elapsed
+        sys.stderr.write('{} files in {:.2f}s, {:.1f} files/s, {:.1f} files/s '
+                         'per worker\n'.format(len(args.sql_input), elapsed,
+                                                rate, rate / args.jobs))
+        args.sql_input = []
+
+    # Each file is refactored on its own, so a failure is reported per file
     if args.refactor:
-        knowledge = json.load(args.map_knowledge[0])
-        refactor = Refactor(knowledge)
-        refactor.refactor(sql_input.read())
-        result = refactor.result()
-        print(result)
-        args.output.write(result)
-        continue
-
-    parsed = parse(sql_input.read())
-
-    # Rewrite the query
-    if args.convert:
-        parsed = convert(args.convert, parsed)
-
-    # Show the tables used (writing and reading)
-    if args.type == 'graph':
-        dep_tables.update(tables(parsed))
-
-    # Show the get_tree() of the AST
-    elif args.type == 'tree':
-        args.output.write(parsed.get_tree())
+        names = [sql_input.name for sql_input in args.sql_input]
+        cache = None
+        stats = dict(hits=0, misses=0)
+        if args.type == 'impact':
+            # Nothing is formatted, only the changes are collected
+            results = impact_all(
+                (sql_input.read() for sql_input in args.sql_input),
+                args.map_knowledge[0], args.jobs, knowledge,
+                args.prune_wildcards)
+            json.dump(impact_report(names, results), args.output, indent=2)
+            args.output.write('\n')
+        elif args.jobs > 1:
+            results = refactor_all(
+                (sql_input.read() for sql_input in args.sql_input),
+                args.map_knowledge[0], args.jobs, knowledge,
+                args.prune_wildcards, args.refactor_cache, stats)
+        else:
+            # Written as each statement is done, one file at a time
+            cache = args.refactor_cache and RefactorCache(args.refactor_cache)
+            results = (refactor_to(args.output, sql_input.read(), knowledge,
+                                   args.prune_wildcards, cache)
+                       for sql_input in args.sql_input)
+        failed = 0
+        for name, (result, error) in zip(names, results):
+            if error:
+                sys.stderr.write('{}: {}\n'.format(name, error))
+                failed += 1
+            elif result and args.type != 'impact':
+                args.output.write(result)
+        if cache:
+            cache.close()
+            stats = dict(hits=cache.hits, misses=cache.misses)
+        if args.refactor_cache and args.type != 'impact':
+            sys.stderr.write('refactor cache: {hits} hits, {misses} misses\n'
+                             .format(**stats))
+        if failed:
+            sys.exit('{} of {} files failed to refactor'.format(
+                failed, len(names)))
+        return
+
+    for sql_input in args.sql_input:
+        parsed = parse(sql_input.read())
+
+        # Rewrite the query
+        if args.convert:
+            parsed = convert(args.convert, parsed)
+
+        # Show the tables used (writing and reading)
+        if args.type in ('graph', 'cycles'):
+            dep_tables.update(tables(parsed))
+
+        # Column lineage, as a graph of 'table.column'
+        elif args.type == 'columns':
+            dep_tables.update(columns(parsed))
+
+        # Statements in order, for scheduling across all of the inputs
+        elif args.type == 'plan':
+            for i, dep in enumerate(statement_tables(parsed)):
+                statements.append(dep)
+                labels.append('{}:{}'.format(sql_input.name, i + 1))
+
+        # CTE bodies and subqueries, compared across all of the inputs
+        elif args.type == 'duplicates':
+            queries(parsed, sql_input.name, found)
+
+        # Show the get_tree() of the AST
+        elif args.type == 'tree':
+            args.output.write(parsed.get_tree())
+            args.output.write('\n')
+
+        # For the query
+        elif args.type == 'format':
+            if parsed.write_sql(args.output, args.compact, profile,
+                                jobs=args.jobs):
+                sys.stderr.write('{}: layout budget exceeded, compact layout '
+                                 'used in places\n'.format(sql_input.name))
+            args.output.write('\n')
+
+    # Graph of dependency is done on all of the SQL combined
+    if args.type in ('graph', 'columns'):
+        min_graph = tables_to_graph(dep_tables, args.graph_minimise)
+        EXPORTERS[args.graph_format](args.output, min_graph)
+
+    # Waves of statements that can run concurrently
+    if args.type == 'plan':
+        json.dump(plan_to_json(statements, labels), args.output, indent=2)
         args.output.write('\n')
 
-    # For the query
-    elif args.type == 'format':
-        sql = parsed.as_sql(args.compact)
-        args.output.write(sql)
+    # Repeated queries that could be materialised once
+    if args.type == 'duplicates':
+        json.dump(find_duplicates(found), args.output, indent=2)
         args.output.write('\n')
 
-# Graph of dependency is done on all of the SQL combined
-if args.type == 'graph':
-    min_graph = tables_to_graph(dep_tables, args.graph_minimise)
+    # Circular dependencies, one cluster per strongly connected component
+    if args.type == 'cycles':
+        full_graph = tables_to_graph(dep_tables, False, self_loops=True)
+        cycles = find_cycles(full_graph)
+
+        args.output.write('digraph cycles {\n')
+        for i, cycle in enumerate(cycles):
+            members = set(cycle)
+            args.output.write('subgraph cluster_{} {{\n'.format(i))
+            for dest in cycle:
+                for src in sorted(full_graph[dest] & members):
+                    args.output.write('"{}" -> "{}";\n'.format(dest, src))
+            args.output.write('}\n')
+        args.output.write('}\n')
+        if cycles:
+            sys.stderr.write('{} circular dependencies found\n'.format(
+                len(cycles)))
+
 
-    args.output.write('digraph connections {\n')
-    for dest in min_graph:
-        for src in min_graph[dest]:
-            args.output.write('"{}" -> "{}";\n'.format(dest, src))
-    args.output.write('}\n')
+if __name__ == '__main__':
+    args = argparser.parse_args()
+    if not args.sql_input and not (args.lineage_db or args.compile_knowledge):
+        argparser.error('the following arguments are required: sql_input')
+    if (args.upstream or args.downstream) and not args.lineage_db:
+        argparser.error('--upstream and --downstream need --lineage_db')
+    if args.prune and not (args.publish and args.output_dir):
+        # Without --publish every final table would be dead
+        argparser.error('--prune needs --publish and --output_dir')
+    if (args.refactor or args.compile_knowledge) and not args.map_knowledge:
+        argparser.error('--refactor and --compile_knowledge need '
+                        '--map_knowledge')
+    if args.type == 'impact' and not args.refactor:
+        argparser.error('--type impact needs --refactor')
+    main(args)
@@ -14,9 +14,29 @@
 #
 
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from .parser import SQLScript
 from .lexer import SQLLexer
+from .node import PROFILE
 
 
 def parse(sql):
     return SQLScript.parse(SQLLexer(sql))
+
+
+def _format_sql(sql, compact, profile):
+    return parse(sql).as_sql(compact, profile)
+
+
+def format_sql(sqls, compact=False, profile=PROFILE, max_workers=None):
+    """Parse and format several SQL texts in a thread pool.
+
+    Parsing and layout share no mutable state between calls, so the texts
+    may be formatted concurrently, each call with its own profile if needed.
+    Results are returned in the order of the input.
+    """
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(partial(_format_sql, compact=compact,
+                                     profile=profile), sqls))
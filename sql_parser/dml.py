@@ -436,7 +436,7 @@ class SQLCreate(SQLDML):
 
         return SQLCreate(clause, table, columns, options, query)
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLMergeDelete(SQLDML):
 
     def sqlf(self, compact):
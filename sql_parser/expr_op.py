@@ -401,7 +401,7 @@ class SQLCase(SQLExpr):
                         LB([TB('WHEN '), if_expr_compact, TB(' THEN')]),
                         IB(then_expr)
                     ])
-                ])
+                ], fallback=1)
             )
         if self.else_expr:
             else_expr_compact = LB([TB(' ELSE '), self.else_expr.sqlf(True)])
@@ -412,7 +412,7 @@ class SQLCase(SQLExpr):
                 CB([
                     SB([TB('ELSE '), IB(else_expr_norm)]),
                     else_expr_compact
-                ])
+                ], fallback=1)
             )
 
         case_block = TB('CASE ')
@@ -30,7 +30,7 @@ from .node import SQLNode
 from .expr import SQLExpr
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLIdentifier(SQLNode):
     value: str
 
@@ -51,7 +51,7 @@ class SQLIdentifier(SQLNode):
                 lex.error('expected identifier'))
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLIdentifierPath(SQLExpr):
     names: SQLNodeList[SQLIdentifier]
 
@@ -88,7 +88,7 @@ class SQLIdentifierPath(SQLExpr):
         return SQLIdentifierPath(SQLNodeList(names))
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLWildcardPath(SQLIdentifierPath):
     names: SQLNodeList[SQLIdentifier]
     except_ids: SQLNodeList[SQLIdentifier]
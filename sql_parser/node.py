@@ -23,24 +23,15 @@ from dataclasses import replace
 from typing import Generic
 from typing import TypeVar
 from typing import Sequence
-from typing import Any
 
 from io import StringIO
 
 import rfmt.base as base
 
 
-# Default options for formatting SQL
-_options: Any = base.Options()
-_options.m0 = 0
-_options.m1 = 100
-_options.c0 = 0.05
-_options.c1 = 240
-_options.cb = 2
-_options.cpack = 1e-3
-_options.ind = 2
-_options.force_brace = False
-_options.space_arg_eq = True
+# Default profile for formatting SQL
+PROFILE = base.Profile(m0=0, m1=100, c0=0.05, c1=240, cb=2, cpack=1e-3,
+                       ind=2)
 
 
 @dataclass(frozen=True)
@@ -67,11 +58,30 @@ class SQLNode:
         """Return compact representation of tree"""
         return repr(self)
 
-    def as_sql(self, compact=False):
+    def as_sql(self, compact=False, profile=PROFILE):
         """Fully formatted SQL for this node."""
         outp = StringIO()
-        self.sqlf(compact).PrintOn(outp)
-        return re.sub(r' *$', '', outp.getvalue(), flags=re.MULTILINE)
+        self.write_sql(outp, compact, profile)
+        return outp.getvalue()
+
+    def write_sql(self, outp, compact=False, profile=PROFILE):
+        """Write fully formatted SQL for this node to a stream.
+
+        Returns True if the profile's layout budget was exceeded and parts of
+        the SQL fell back to their compact layout.
+        """
+        return self.sqlf(compact).PrintOn(outp, profile)
+
+    def as_sql_widths(self, widths, compact=False, profile=PROFILE):
+        """Fully formatted SQL for several widths, sharing a single solve.
+
+        The solve uses the widest width as the right margin, so the output
+        for that width is identical to as_sql() with the same margin.
+        """
+        outps = {width: StringIO() for width in widths}
+        self.sqlf(compact).PrintOnWidths(outps,
+                                         profile.Replace(m1=max(widths)))
+        return {width: outp.getvalue() for width, outp in outps.items()}
 
     def sqlf(self, compact):
         """Return format-blocks for this node."""
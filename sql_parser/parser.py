@@ -17,11 +17,15 @@
 from typing import List
 from typing import Optional
 from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from io import StringIO
 
 from rfmt.blocks import StackBlock as SB
 
 from .node import SQLNodeList
 from .node import SQLNode
+from .node import PROFILE
 
 from .func import SQLFunction
 from .query import SQLQuery
@@ -36,6 +40,39 @@ class SQLScript(SQLNode):
     def sqlf(self, compact):
         return SB([cmd.sqlf(compact) for cmd in self.commands])
 
+    def write_sql(self, outp, compact=False, profile=PROFILE, jobs=1,
+                  separator='\n'):
+        """Write formatted SQL, laying out each command independently.
+
+        Commands are stacked, so no command affects the layout of another
+        and the output is the same as laying out sqlf() as a whole. With
+        jobs > 1 the commands are formatted in a process pool and written
+        in their original order.
+
+        The layout budget of the profile applies to each command; returns
+        True if it was exceeded for any of them. separator is written
+        between the commands; give one with ';' for a script that can run.
+        """
+        if jobs > 1 and len(self.commands) > 1:
+            with ProcessPoolExecutor(jobs) as pool:
+                chunksize = max(1, len(self.commands) // (jobs * 4))
+                return self._write_commands(outp, pool.map(
+                    _format_command, self.commands, repeat(compact),
+                    repeat(profile), chunksize=chunksize), separator)
+        return self._write_commands(outp, (
+            _format_command(cmd, compact, profile)
+            for cmd in self.commands), separator)
+
+    @staticmethod
+    def _write_commands(outp, formatted, separator):
+        any_degraded = False
+        for i, (sql, degraded) in enumerate(formatted):
+            if i:
+                outp.write(separator)
+            outp.write(sql)
+            any_degraded = any_degraded or degraded
+        return any_degraded
+
     @staticmethod
     def parse(lex) -> 'SQLScript':
         commands: List[SQLNode] = []
@@ -77,6 +114,12 @@ class SQLScript(SQLNode):
         return SQLScript(SQLNodeList(commands))
 
 
+def _format_command(cmd, compact, profile):
+    outp = StringIO()
+    degraded = cmd.write_sql(outp, compact, profile)
+    return outp.getvalue(), degraded
+
+
 @dataclass(frozen=True)
 class SQLWithFunctions(SQLQuery):
     sql: SQLNode
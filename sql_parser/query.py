@@ -43,7 +43,7 @@ class SQLAlias(SQLNode):
         return SQLAlias(alias)
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLTableSource(SQLNode):
 
     @staticmethod
@@ -70,7 +70,7 @@ class SQLTableSource(SQLNode):
         return SQLNamedTable.parse(lex, False)
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLNamedTable(SQLTableSource):
     table: SQLIdentifierPath
     alias: Optional[SQLAlias] = None
@@ -89,7 +89,8 @@ class SQLNamedTable(SQLTableSource):
         while lex.consume('-'):
             next_table_name = SQLIdentifierPath.parse(lex)
             if next_table_name:
-                table_name.names[0].value += '-' + '.'.join(next_name.value for next_name in next_table_name.names)
+                first = SQLIdentifier(table_name.names[0].value + '-' + '.'.join(next_name.value for next_name in next_table_name.names))
+                table_name = SQLIdentifierPath(SQLNodeList([first] + list(table_name.names[1:])))
         alias = SQLAlias.consume(lex)
         return SQLNamedTable(table_name, alias, is_write)
 
@@ -15,8 +15,10 @@
 
 
 from dataclasses import dataclass
+from dataclasses import replace
 from typing import Optional
 from typing import List
+from typing import cast
 
 from rfmt.blocks import LineBlock as LB
 from rfmt.blocks import IndentBlock as IB
@@ -40,6 +42,7 @@ from .expr import SQLExpr
 from .query import SQLQuery
 from .query import SQLAlias
 from .query import SQLTableSource
+from .query import SQLNamedTable
 
 
 @dataclass(frozen=True)
@@ -54,7 +57,7 @@ class SQLSetOp(SQLQuery):
              self.right.sqlf(compact)])
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLField(SQLNode):
     expr: SQLNode
     alias: Optional[SQLAlias]
@@ -194,7 +197,7 @@ class SQLOrderedQuery(SQLQuery):
         ])
 
 
-@dataclass(frozen=False)
+@dataclass(frozen=True)
 class SQLSelect(SQLQuery):
     fields: SQLNodeList[SQLField]
     where_expr: Optional[SQLExpr] = None
@@ -452,7 +455,7 @@ class SQLFrom(SQLNode):
             if not join:
                 break
             if join.join_keyword == 'USING':
-                join.fix_left_alias(prev_alias)
+                join = join.fix_left_alias(prev_alias)
                 prev_alias = join.table.alias
             joins.append(join)
 
@@ -527,7 +530,7 @@ class SQLJoin(SQLNode):
             while True:
                 field = SQLIdentifierPath.parse(lex)
                 if join_table.alias is None:
-                    join_table.alias = SQLAlias(SQLIdentifier(join_table.table.names[-1].value))
+                    join_table = replace(cast(SQLNamedTable, join_table), alias=SQLAlias(SQLIdentifier(join_table.table.names[-1].value)))
                 right = SQLIdentifierPath(SQLNodeList([join_table.alias.alias]) + field.names)
                 if join_expr is None: 
                     join_expr = SQLBiOp('=', field, right)
@@ -539,19 +542,19 @@ class SQLJoin(SQLNode):
             join_keyword = 'USING'
         return SQLJoin(join_type, join_table, join_expr, join_keyword)
 
-    def fix_left_alias(self, alias: SQLAlias):
-        if self.join_keyword != 'USING':
-            return
-        expr = self.join_expr
-        while True:
-            if expr.sql_op == '=':
-                left = expr.left
-                names = left.names   
-                left.names = names if alias is None else (SQLNodeList([alias.alias]) + names)
-                break
-            elif expr.sql_op == 'AND':
-                right_expr = expr.right
-                left = right_expr.left
-                names = left.names   
-                left.names = SQLNodeList([alias.alias]) + names
-                expr = expr.left
\ No newline at end of file
+    def fix_left_alias(self, alias: SQLAlias) -> 'SQLJoin':
+        """This join with the left columns of USING qualified by alias."""
+        if self.join_keyword != 'USING' or alias is None:
+            return self
+        return replace(self, join_expr=SQLJoin._qualify_left(self.join_expr,
+                                                             alias))
+
+    @staticmethod
+    def _qualify_left(expr, alias: SQLAlias):
+        if expr.sql_op == 'AND':
+            return replace(expr, left=SQLJoin._qualify_left(expr.left, alias),
+                           right=SQLJoin._qualify_left(expr.right, alias))
+        left = expr.left
+        names: SQLNodeList[SQLIdentifier] = SQLNodeList(
+            [alias.alias] + list(left.names))
+        return replace(expr, left=replace(left, names=names))
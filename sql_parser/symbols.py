@@ -0,0 +1,336 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+"""Symbol table - what each column reference of a query refers to.
+
+resolve() walks a statement once, keeping the tables of each FROM clause in
+scope, and records for every SQLIdentifierPath in an expression the table
+source it reads and the column. Passes that rewrite or analyse columns look
+the answer up instead of searching the FROM clauses again.
+
+"""
+
+from collections import namedtuple
+
+from .node import SQLNode
+from .ident import SQLIdentifierPath, SQLWildcardPath
+from .query import SQLNamedTable, SQLFunctionTable
+from .query_impl import (SQLWithSelect, SQLSelect, SQLSetOp, SQLOrderedQuery,
+                         SQLSubSelect, SQLFrom, SQLJoin)
+
+
+class Symbol(namedtuple('Symbol', ['source', 'alias', 'column',
+                                   'qualified'])):
+    """A resolved column reference.
+
+    source: the table name (last part of the path), or the alias of a
+        subquery; None if the column could come from several tables.
+    alias: the alias the source was given in the FROM clause, if any.
+    column: the column name, without the qualifier; None if the path is
+        the alias alone (the whole row, or an UNNEST element).
+    qualified: True if the reference starts with the alias or table name.
+    """
+    pass
+
+
+class SymbolTable:
+    """Symbols by node; nodes are compared by identity, not value.
+
+    Also kept: the columns read from each source, by name, and the name of
+    each CTE or subquery SELECT whose columns are read by name.
+    """
+
+    def __init__(self):
+        self._symbols = dict()
+        self._reads = dict()
+        self._derived = dict()
+
+    def add(self, node, symbol):
+        # The node is kept so that its id() is not reused
+        self._symbols[id(node)] = (node, symbol)
+
+    def get(self, node, default=None):
+        entry = self._symbols.get(id(node))
+        if entry is None or entry[0] is not node:
+            return default
+        return entry[1]
+
+    def __contains__(self, node):
+        return self.get(node) is not None
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def read(self, source, column=None):
+        """Record that column (all columns if None) of source is read."""
+        key = source.lower()
+        if column is None:
+            self._reads[key] = None
+        elif self._reads.get(key, set()) is not None:
+            self._reads.setdefault(key, set()).add(column.lower())
+
+    def reads(self, source):
+        """Lower case names of the columns read from any source called
+        source, or None if all of them may be read."""
+        return self._reads.get(source.lower(), set())
+
+    def add_derived(self, select, name):
+        self._derived[id(select)] = (select, name)
+
+    def derived(self, select):
+        """Name of the CTE or subquery whose body is select, if any."""
+        entry = self._derived.get(id(select))
+        if entry is None or entry[0] is not select:
+            return None
+        return entry[1]
+
+
+class _Source(namedtuple('_Source', ['name', 'alias', 'columns'])):
+    """A table in a FROM clause; columns is the set of its (lower case)
+    column names, or None if they are not known."""
+    pass
+
+
+class _Scope:
+    """The tables of a FROM clause, within any enclosing query."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.sources = []
+
+    def qualifier(self, name):
+        """The source a path starting with name is qualified by."""
+        scope = self
+        while scope:
+            # Aliases and table names as written, then ignoring case
+            for source in scope.sources:
+                if name == (source.alias or source.name):
+                    return source
+            for source in scope.sources:
+                if name.lower() == (source.alias or source.name).lower():
+                    return source
+            scope = scope.parent
+        return None
+
+    def candidates(self, name=None):
+        """Sources an unqualified column could come from.
+
+        Without name, the sources of the innermost FROM clause. With name,
+        those that may have the column, in the enclosing queries too until
+        a source is known to have it.
+        """
+        scope = self
+        found = []
+        while scope:
+            if name is None:
+                if scope.sources:
+                    return scope.sources
+            else:
+                having = scope.having(name)
+                found.extend(having)
+                if any(source.columns is not None for source in having):
+                    break
+            scope = scope.parent
+        return found
+
+    def having(self, name):
+        """The sources of this scope that have, or could have, column name;
+        tables with unknown columns could have any."""
+        return [source for source in self.sources
+                if source.columns is None or name.lower() in source.columns]
+
+    def column(self, name):
+        """The source of an unqualified column, if only one can have it."""
+        found = None
+        scope = self
+        while scope:
+            having = scope.having(name)
+            if found is None:
+                if len(having) > 1:
+                    return None
+                if having:
+                    found = having[0]
+                    if found.columns is not None:
+                        return found
+            elif having:
+                # A correlated column of an enclosing query, or not
+                return None
+            scope = scope.parent
+        return found
+
+
+def _output_columns(expr):
+    """Lower case names of the columns of a query, None if not known."""
+
+    if isinstance(expr, SQLWithSelect):
+        return _output_columns(expr.select)
+    if isinstance(expr, SQLSetOp):
+        return _output_columns(expr.left)
+    if isinstance(expr, (SQLOrderedQuery, SQLSubSelect)):
+        return _output_columns(expr.query)
+    if not isinstance(expr, SQLSelect):
+        return None
+
+    columns = set()
+    for field in expr.fields:
+        if isinstance(field.expr, SQLWildcardPath):
+            return None
+        if field.alias:
+            columns.add(field.alias.alias.value.lower())
+        elif isinstance(field.expr, SQLIdentifierPath) and field.expr.names:
+            columns.add(field.expr.names[-1].value.lower())
+    return columns
+
+
+def _path(expr, scope, symbols):
+    names = [name.value for name in expr.names]
+    if not names:
+        return
+
+    source = scope.qualifier(names[0])
+    if source:
+        column = names[1] if len(names) > 1 else None
+        symbols.add(expr, Symbol(source.name, source.alias, column, True))
+        symbols.read(source.name, column)
+        return
+
+    source = scope.column(names[0])
+    symbols.add(expr, Symbol(source and source.name, source and source.alias,
+                             names[0], False))
+    for candidate in [source] if source else scope.candidates(names[0]):
+        symbols.read(candidate.name, names[0])
+
+
+def _wildcard(expr, scope, symbols):
+    """A SELECT * (or alias.*) reads every column of its sources."""
+    if expr.names:
+        source = scope.qualifier(expr.names[0].value)
+        sources = [source] if source else []
+    else:
+        sources = scope.candidates()
+    for source in sources:
+        symbols.read(source.name)
+
+
+def _body(query):
+    """The SELECT of a CTE or subquery, if its columns can be pruned."""
+    while isinstance(query, SQLWithSelect) and not query.tables:
+        query = query.select
+    if (isinstance(query, SQLSelect) and not query.select_as_type and
+            query.select_type in (None, 'ALL')):
+        return query
+    return None
+
+
+def _from(expr, scope, ctes, symbols):
+    """Add the tables of a FROM clause to scope, in order."""
+
+    if isinstance(expr, SQLFrom):
+        _from(expr.base, scope, ctes, symbols)
+        for join in expr.joins:
+            _from(join, scope, ctes, symbols)
+
+    elif isinstance(expr, SQLJoin):
+        _from(expr.table, scope, ctes, symbols)
+        # The join condition sees the tables joined so far
+        if expr.join_expr:
+            _walk(expr.join_expr, scope, ctes, symbols)
+
+    elif isinstance(expr, SQLNamedTable):
+        name = expr.table.names[-1].value
+        alias = expr.alias.alias.value if expr.alias else None
+        columns = ctes.get(name.lower()) if len(expr.table.names) == 1 \
+            else None
+        scope.sources.append(_Source(name, alias, columns))
+
+    elif isinstance(expr, SQLSubSelect):
+        # Not correlated with the tables next to it
+        _walk(expr.query, scope.parent, ctes, symbols)
+        alias = expr.alias.alias.value if expr.alias else None
+        body = _body(expr.query)
+        if body:
+            symbols.add_derived(body, alias or '')
+        scope.sources.append(_Source(alias or '', alias,
+                                     _output_columns(expr.query)))
+
+    elif isinstance(expr, SQLFunctionTable):
+        # UNNEST(t.array) reads the tables before it
+        _walk(expr.expr, scope, ctes, symbols)
+        if expr.alias:
+            name = expr.alias.alias.value
+            scope.sources.append(_Source(name, name, None))
+
+
+def _walk(expr, scope, ctes, symbols):
+    """Resolve the column references of expr within scope.
+
+    Returns: the scope of the tables of expr, if it is a SELECT
+    """
+
+    if isinstance(expr, SQLWithSelect):
+        if expr.tables:
+            ctes = dict(ctes)
+            for table, sql in zip(expr.tables, expr.sqls):
+                _walk(sql, scope, ctes, symbols)
+                ctes[table.value.lower()] = _output_columns(sql)
+                body = _body(sql)
+                if body:
+                    symbols.add_derived(body, table.value)
+        _walk(expr.select, scope, ctes, symbols)
+
+    elif isinstance(expr, SQLSelect):
+        inner = _Scope(scope)
+        if expr.from_tables:
+            _from(expr.from_tables, inner, ctes, symbols)
+        for field in expr.fields:
+            if isinstance(field.expr, SQLWildcardPath):
+                _wildcard(field.expr, inner, symbols)
+        for name, child in expr.children():
+            if name != 'from_tables':
+                _walk(child, inner, ctes, symbols)
+        return inner
+
+    elif isinstance(expr, SQLOrderedQuery):
+        # ORDER BY and LIMIT see the tables of the SELECT they order
+        inner = _walk(expr.query, scope, ctes, symbols)
+        _walk(expr.ordering, inner or scope, ctes, symbols)
+
+    elif isinstance(expr, SQLWildcardPath):
+        # COUNT(*) reads no column
+        pass
+
+    elif isinstance(expr, SQLIdentifierPath):
+        if scope is not None:
+            _path(expr, scope, symbols)
+
+    elif isinstance(expr, (SQLFrom, SQLNamedTable)):
+        # Outside of a SELECT, such as the tables of an UPDATE
+        _from(expr, _Scope(scope), ctes, symbols)
+
+    elif isinstance(expr, SQLNode):
+        for _, child in expr.children():
+            _walk(child, scope, ctes, symbols)
+
+
+def resolve(expr, symbols=None):
+    """Resolve the column references of expr (a statement or script).
+
+    Returns: SymbolTable
+    """
+
+    if symbols is None:
+        symbols = SymbolTable()
+    _walk(expr, None, dict(), symbols)
+    return symbols
@@ -16,9 +16,13 @@
 import unittest
 import mock
 
+from io import StringIO
+
 from .const import SQLConstant
 
 from . import parse
+from . import format_sql
+from .node import PROFILE
 
 
 def mock_type_parser(lex):
@@ -194,3 +198,56 @@ class TestParser(unittest.TestCase):
     def test_sql_create(self):
         self.assert_sql('CREATE OR replace TABLE y (i INT64, b BOOL) AS SELECT 1',
                         'CREATE OR REPLACE TABLE y(i INT64,b BOOL)AS SELECT 1')
+
+    def test_sql_widths(self):
+        expr = parse('SELECT ' + ', '.join('LongFunctionName(%d)' % i
+                                           for i in range(10)) + ' FROM t')
+        widths = expr.as_sql_widths([40, 100])
+        self.assertEqual(widths[100], expr.as_sql())
+        self.assertTrue(all(len(line) <= 40
+                            for line in widths[40].split('\n')))
+        self.assertEqual(str(parse(widths[40])), str(expr))
+
+    def test_format_sql_profiles(self):
+        sqls = ['SELECT ' + ', '.join('LongFunctionName(%d)' % i
+                                      for i in range(n)) + ' FROM t'
+                for n in range(1, 20)]
+        expected = [parse(sql).as_sql() for sql in sqls]
+        self.assertEqual(format_sql(sqls, max_workers=4), expected)
+
+        narrow = PROFILE.Replace(m1=40)
+        for sql in format_sql(sqls, profile=narrow, max_workers=4):
+            self.assertTrue(all(len(line) <= 40 for line in sql.split('\n')))
+
+    def test_write_sql(self):
+        expr = parse('SELECT a AS x, b FROM t AS u WHERE a = 1; SELECT 2')
+        outp = StringIO()
+        expr.write_sql(outp)
+        self.assertEqual(outp.getvalue(), expr.as_sql())
+        self.assertFalse(any(line.endswith(' ')
+                             for line in outp.getvalue().split('\n')))
+
+    def test_write_sql_commands(self):
+        expr = parse('SELECT a AS x, b FROM t; TRUNCATE TABLE u; '
+                     'SELECT ' + ', '.join('LongFunctionName(%d)' % i
+                                           for i in range(20)) + ' FROM t')
+        outp = StringIO()
+        expr.sqlf(False).PrintOn(outp, PROFILE)
+        self.assertEqual(expr.as_sql(), outp.getvalue())
+
+        outp = StringIO()
+        expr.write_sql(outp, jobs=2)
+        self.assertEqual(expr.as_sql(), outp.getvalue())
+
+    def test_layout_budget(self):
+        expr = parse('SELECT CASE WHEN a = 1 THEN f(a, b) ELSE g(a) END AS c, '
+                     + ', '.join('LongFunctionName(%d)' % i
+                                 for i in range(20)) + ' FROM t')
+        self.assertFalse(expr.write_sql(StringIO()))
+
+        for limits in [dict(max_visits=10), dict(max_knots=2),
+                       dict(max_seconds=0)]:
+            outp = StringIO()
+            self.assertTrue(expr.write_sql(outp,
+                                           profile=PROFILE.Replace(**limits)))
+            self.assertEqual(str(parse(outp.getvalue())), str(expr))
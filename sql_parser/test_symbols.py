@@ -0,0 +1,77 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+import unittest
+
+from . import parse
+from .ident import SQLIdentifierPath
+from .symbols import resolve, Symbol
+
+
+def paths(expr, found):
+    if isinstance(expr, SQLIdentifierPath):
+        found.append(expr)
+    if hasattr(expr, 'children'):
+        for _, child in expr.children():
+            paths(child, found)
+    return found
+
+
+class TestSymbols(unittest.TestCase):
+
+    def resolved(self, sql):
+        parsed = parse(sql)
+        symbols = resolve(parsed)
+        return [(str(path), symbols.get(path))
+                for path in paths(parsed, [])
+                if path in symbols]
+
+    def test_alias(self):
+        self.assertEqual(
+            self.resolved('SELECT a.x, t2.y, z FROM t1 AS a JOIN t2 '
+                          'ON a.id = t2.id'),
+            [('a.x', Symbol('t1', 'a', 'x', True)),
+             ('t2.y', Symbol('t2', None, 'y', True)),
+             ('z', Symbol(None, None, 'z', False)),
+             ('a.id', Symbol('t1', 'a', 'id', True)),
+             ('t2.id', Symbol('t2', None, 'id', True))])
+
+    def test_derived(self):
+        # Only the CTE is known to have z; t2 could have any column
+        self.assertEqual(
+            self.resolved('WITH c AS (SELECT x AS z FROM t1) '
+                          'SELECT z FROM c'),
+            [('x', Symbol('t1', None, 'x', False)),
+             ('z', Symbol('c', None, 'z', False))])
+        self.assertEqual(
+            self.resolved('WITH c AS (SELECT x AS z FROM t1) '
+                          'SELECT z FROM c, t2')[1],
+            ('z', Symbol(None, None, 'z', False)))
+        self.assertEqual(
+            self.resolved('SELECT q.k, y FROM (SELECT k FROM t4) q, '
+                          '(SELECT y FROM t5) r'),
+            [('q.k', Symbol('q', 'q', 'k', True)),
+             ('y', Symbol('r', 'r', 'y', False)),
+             ('k', Symbol('t4', None, 'k', False)),
+             ('y', Symbol('t5', None, 'y', False))])
+
+    def test_scopes(self):
+        self.assertEqual(
+            self.resolved('SELECT e FROM t AS a, UNNEST(a.arr) AS e '
+                          'WHERE EXISTS (SELECT 1 FROM u WHERE u.x = a.x)'),
+            [('e', Symbol('e', 'e', None, True)),
+             ('u.x', Symbol('u', None, 'x', True)),
+             ('a.x', Symbol('t', 'a', 'x', True)),
+             ('a.arr', Symbol('t', 'a', 'arr', True))])
@@ -6,88 +6,267 @@ from sql_parser.query import SQLAlias, SQLNamedTable
 from sql_parser.node import SQLNode, SQLNodeList
 from sql_parser.query_impl import SQLField, SQLFrom, SQLJoin, SQLOrderedQuery, SQLSelect, SQLSetOp, SQLSubSelect, SQLWithSelect
 from sql_parser.lexer import ParsingError
+from sql_parser.symbols import resolve, SymbolTable
+from sql_refactor.cache import (statement_key, Recorder, RecordingDict,
+                                CachedStatement)
 from sql_parser.types import SQLConcreteType
 from sql_parser import parse
 
-import copy
 import re
+from collections import ChainMap
+from collections.abc import Mapping
+from typing import Any, Dict, List, MutableMapping, Set, cast
+from dataclasses import replace
 
 
+def _replace(node, **changes):
+    """node with changes, or node itself if nothing changed."""
+    if all(getattr(node, name) is value for name, value in changes.items()):
+        return node
+    return replace(node, **changes)
+
+
+def _node_list(nodes, new_nodes):
+    """new_nodes as a SQLNodeList, or nodes itself if nothing changed."""
+    if len(nodes) == len(new_nodes) and \
+            all(new is old for new, old in zip(new_nodes, nodes)):
+        return nodes
+    return SQLNodeList(new_nodes)
+
 
 class Refactor:
 
     COMMENT_COLUMN_NOT_FOUND = "[WARNING] Could not find column in knowledge: {}/{}"
     COMMENT_TABLE_NOT_FOUND = "[WARNING] Could not find table in knowledge: {}"
 
-    def __init__(self, knowledge:dict):
-        self._knowledge = knowledge
+    def __init__(self, knowledge:Mapping, prune_wildcards:bool=False, cache=None):
+        # Tables created by the refactored statements are added to a session
+        # layer, and each query block pushes its own scope (CTEs, subselects)
+        # on top; the caller's knowledge is never modified.
+        self._cache = cache
+        self._base = knowledge
+        if cache is None:
+            self._session:MutableMapping[str, Any] = {}
+        else:
+            # The tables looked up by each statement key its cache entry
+            self._consulted:Set[str] = set()
+            self._session = RecordingDict(self._consulted)
+            knowledge = Recorder(knowledge, self._consulted)
+        # Only the first map of a ChainMap is written to
+        self._knowledge = ChainMap(self._session, cast(MutableMapping[str, Any], knowledge))
+        # Compiled entries, one dictionary per map of self._knowledge
+        self._compiled:List[Dict[str, Any]] = [{}, {}]
+        self._lookups:List[Dict[tuple, Any]] = []
+        self._symbols = SymbolTable()
+        # Expand the wildcards of CTEs and subqueries to the columns read
+        self._prune_wildcards = prune_wildcards
+        # The changes made to the current statement, while running impact()
+        self._changes = None
         self.parsed = []
         self.declare_header = ""
+        # First and last line of the statement last yielded by statements()
+        self.lines = None
 
     def result(self):
         if self.parsed:
-            sql = ""
-            for parsed in self.parsed[:-1]:
-                sql += '{}\n;\n\n'.format(parsed.as_sql())
-            sql += self.parsed[-1].as_sql()
-            sql = self.declare_header + '\n\n' + sql
-            return sql
+            sql = '\n;\n\n'.join(parsed.as_sql() for parsed in self.parsed)
+            return self.declare_header + '\n\n' + sql
 
     def refactor(self, sql, parse_only=False):
         self.parsed = []
-        sql_commands = sql.strip('\n').split(';')
+        for parsed in self.statements(sql, parse_only):
+            self.parsed.append(parsed)
+
+    def write(self, sql, outp):
+        """Refactor sql, writing each statement to outp as soon as it is
+        done. The output is the same as result() after refactor(), but only
+        one statement is kept at a time.
+
+        Returns True if anything was written.
+        """
+        self.parsed = []
+        written = False
+        for parsed in self.statements(sql):
+            outp.write('\n;\n\n' if written else self.declare_header + '\n\n')
+            parsed.write_sql(outp)
+            written = True
+        return written
+
+    def impact(self, sql):
+        """The changes refactor() would make to sql, without formatting it.
+
+        Returns: list of {'statement', 'lines', 'changes'}, one per statement
+        that would change, where lines are the first and last lines of the
+        statement in sql and each change is a dictionary with a 'kind' of
+        'table', 'column', 'cast', 'table_not_found' or 'column_not_found'
+        """
+        self.parsed = []
+        report = []
+        self._changes = []
+        try:
+            for i, _ in enumerate(self.statements(sql)):
+                if self._changes:
+                    report.append({'statement': i + 1,
+                                   'lines': list(self.lines),
+                                   'changes': self._changes})
+                self._changes = []
+        finally:
+            self._changes = None
+        return report
+
+    def statements(self, sql, parse_only=False):
+        """Parse and refactor the statements of sql, one at a time.
+
+        DECLARE and SET statements are collected into declare_header, which
+        is complete before the first statement is yielded.
+        """
+        sql_commands = []
+        start = len(sql) - len(sql.lstrip('\n'))
+        for command in sql.strip('\n').split(';'):
+            if command not in ('', '\n'):
+                sql_commands.append((start, command))
+            start += len(command) + 1
+        self.declare_header = ''.join(command + ';' for _, command in sql_commands
+                                      if self._is_declare(command))
+        # The session maps of a previous script are built again if needed
+        self._compiled[-2].clear()
         prev_command = ''
         error = None
-        for command in sql_commands:
-            if command in ('', '\n'):
-                continue
-            if re.match(r'\s*(DECLARE|declare)', command) or re.match(r'\s*(SET|set)', command):
-                self.declare_header += command + ';'
+        for start, command in sql_commands:
+            if self._is_declare(command):
                 continue
+            if prev_command:
+                start = prev_start
+            command = prev_command + command
+            self.lines = self._lines(sql, start, command)
             try:
-                command = prev_command + command
-                parsed = parse(command)
-                self.parsed.append(parsed)
-                if not parse_only:
-                    self._refactor(parsed)
+                if self._cache is not None and self._changes is None and not parse_only:
+                    parsed = self._cached_statement(command)
+                else:
+                    parsed = parse(command)
+                    if not parse_only:
+                        parsed = self.rewrite(parsed)
                 prev_command = ''
                 error = None
             except ParsingError as e:
                 prev_command = command + ';'
+                prev_start = start
                 error = e
+                continue
+            yield parsed
         if error:
             raise error
 
+    def _cached_statement(self, command):
+        """The refactored statement from the cache, or refactored now and
+        cached; raises ParsingError if it does not parse."""
+        key = statement_key(command, self._prune_wildcards)
+        before = ChainMap(dict(self._session), self._base)
+        cached = self._cache.get(key, before)
+        if cached is not None:
+            sql, created = cached
+            self._session.update(created)
+            return CachedStatement(sql)
+
+        parsed = parse(command)
+        self._consulted.clear()
+        sql = self.rewrite(parsed).as_sql()
+        created = {table : entry for table, entry in self._session.items()
+                   if before.maps[0].get(table) is not entry}
+        self._cache.put(key, self._consulted, before, sql, created)
+        return CachedStatement(sql)
+
+    @staticmethod
+    def _lines(sql, start, command):
+        """First and last line of command, found at start of sql."""
+        body = command.strip()
+        start += len(command) - len(command.lstrip())
+        first = sql.count('\n', 0, start) + 1
+        return first, first + body.count('\n')
+
+    def _record(self, kind, **change):
+        if self._changes is not None:
+            self._changes.append(dict(kind=kind, **change))
+
+    def _column_table(self, tables:dict, column):
+        """The table of tables whose knowledge maps column (the last one,
+        as in _build_column_knowledge)."""
+        found = None
+        for table in tables:
+            compiled = self._compile(table)
+            if compiled is not None and column in compiled[1]:
+                found = table
+        return found
+
+    def _record_column(self, tables:dict, old, new):
+        if self._changes is not None:
+            self._record('column', table=self._column_table(tables, old), old=old, new=new)
+
+    def _record_cast(self, tables:dict, column, type_name):
+        if self._changes is not None:
+            self._record('cast', table=self._column_table(tables, column), column=column, type=type_name)
+
+    @staticmethod
+    def _is_declare(command):
+        return re.match(r'\s*(DECLARE|declare)', command) or re.match(r'\s*(SET|set)', command)
+
+    def rewrite(self, parsed):
+        """Refactor a parsed statement (or script) into a new tree.
+
+        parsed is not modified, and the new tree shares the parts that did not
+        change, so the same parsed tree can be refactored, formatted and
+        analysed by several jobs.
+        """
+        self._symbols = resolve(parsed)
+        return self._refactor(parsed)
 
     def _refactor(self, parsed, tables=None):
         if isinstance(parsed, SQLWithSelect):
-            self._refactor_with_select(parsed)
+            return self._refactor_with_select(parsed)
         elif isinstance(parsed, SQLSelect):
-            self._refactor_select(parsed)
+            return self._refactor_select(parsed)
         elif isinstance(parsed, SQLFrom):
-            self._refactor_from(parsed)
+            return self._refactor_from(parsed)
         elif isinstance(parsed, SQLNamedTable):
-            self._refactor_named_table(parsed)
+            return self._refactor_named_table(parsed)
         elif isinstance(parsed, SQLJoin):
-            self._refactor_join(parsed, tables)
+            return self._refactor_join(parsed, tables)
         elif isinstance(parsed, SQLField):
-            self._refactor_field(parsed, tables)
+            return self._refactor_field(parsed, tables)
         elif isinstance(parsed, SQLIdentifierPath):
-            self._refactor_identifier_path(parsed, tables)
+            return self._refactor_identifier_path(parsed, tables)
         elif isinstance(parsed, SQLCreate):
-            self._refactor_create(parsed)
+            return self._refactor_create(parsed)
         elif isinstance(parsed, SQLSetOp):
             if parsed.op in ('UNION', 'UNION ALL', 'UNION DISTINCT'):
-                self._refactor_union(parsed)
+                return self._refactor_union(parsed)
             else:
-                self._refactor_node(parsed, tables)
+                return self._refactor_node(parsed, tables)
         elif isinstance(parsed, SQLNode):
-            self._refactor_node(parsed, tables)
+            return self._refactor_node(parsed, tables)
+        return parsed
+
+    def _push_scope(self):
+        self._knowledge = self._knowledge.new_child()
+        self._compiled.insert(0, {})
+
+    def _pop_scope(self):
+        self._knowledge = self._knowledge.parents
+        del self._compiled[0]
 
     def _refactor_with_select(self, parsed:SQLWithSelect):
+        self._push_scope()
+        try:
+            return self._refactor_ctes(parsed)
+        finally:
+            self._pop_scope()
+
+    def _refactor_ctes(self, parsed:SQLWithSelect):
         cte_tables = [table.value for table in parsed.tables]
+        sqls = []
         for i, cte in enumerate(parsed.sqls):
-            self._refactor(cte)
+            cte = self._refactor(cte)
+            sqls.append(cte)
 
             # Add CTE into current knowledge
             column_knowledge = {}
@@ -118,111 +297,108 @@ class Refactor:
                 'preserved' : True
             }
 
-        self._refactor(parsed.select)
-
-        # delete unused cte knowledge
-        for cte_table in cte_tables:
-            self._knowledge.pop(cte_table)
-
+        select = self._refactor(parsed.select)
+        return _replace(parsed, sqls=_node_list(parsed.sqls, sqls), select=select)
 
     def _refactor_select(self, parsed:SQLSelect):
+        self._push_scope()
+        self._lookups.append({})
+        try:
+            return self._refactor_select_fields(parsed)
+        finally:
+            self._lookups.pop()
+            self._pop_scope()
+
+    def _refactor_select_fields(self, parsed:SQLSelect):
         old_tables, not_found_tables = self._get_tables_and_alias(parsed.from_tables)
         
-        for table in not_found_tables:
-            parsed.comments.append(self.COMMENT_TABLE_NOT_FOUND.format(table))
-
-        self._refactor(parsed.from_tables)
+        comments = parsed.comments
+        for table in sorted(not_found_tables):
+            self._record('table_not_found', table=table)
+        if not_found_tables:
+            comments = list(comments or []) + [self.COMMENT_TABLE_NOT_FOUND.format(table)
+                                         for table in not_found_tables]
+
+        from_tables = self._refactor(parsed.from_tables)
         
-        index = 0
-        while True:
-            if index == len(parsed.fields):
-                break
-            if len(parsed.fields):
-                field = parsed.fields[index]
-            else:
-                break
-            
-            # Wildcard
+        # Wildcards are expanded into a single new list of fields
+        needed = self._needed_columns(parsed)
+        fields = []
+        expanded = []
+        for field in parsed.fields:
+            columns = None
             if isinstance(field.expr, SQLWildcardPath):
-                if len(old_tables) == 1 or len(field.expr.names) == 0:
-                    column_knowledge = self._get_column_knowledge(old_tables)
-                    if len(column_knowledge) == 0:
-                        index += 1
-                        continue
-                    # Omit columns in EXCEPT
-                    except_ids = [column_id.value for column_id in field.expr.except_ids]
-                    column_names = []
-                    for id in column_knowledge.keys():
-                        if id not in except_ids:
-                            column_names.append(id)
-                    
-                    columns = [ 
-                                SQLField(
-                                    SQLIdentifierPath(
-                                        SQLNodeList([SQLIdentifier(column_name)])
-                                    ), None, []
-                                )
-                                for column_name in column_names
-                            ]
-                else:
-                    table_alias = field.expr.names[0].value
-                    table = None
-                    for t, a in old_tables.items():
-                        if a == table_alias:
-                            table = t
-                            break
-                    column_knowledge = self._get_column_knowledge({table: table_alias})
-                    
-                    if len(column_knowledge) == 0:
-                        index += 1
-                        continue
-
-                    # Omit columns in EXCEPT
-                    except_ids = [column_id.value for column_id in field.expr.except_ids]
-                    column_names = []
-                    for id in column_knowledge.keys():
-                        if id not in except_ids:
-                            column_names.append(id)
-
-                    columns = [ SQLField(
-                                    SQLIdentifierPath(SQLNodeList(
-                                        [SQLIdentifier(table_alias), SQLIdentifier(column_name)])
-                                    ), None, []
-                                )
-                                for column_name in column_names
-                            ]
-                
-                # Insert new column list from wildcard to fields
-                if len(columns) == 0:
-                    pass
-                elif index == 0:
-                    parsed.fields = SQLNodeList(columns) + parsed.fields[index+1:]
-                else:
-                    parsed.fields = parsed.fields[:index] + SQLNodeList(columns) + parsed.fields[index+1:]
-                if len(parsed.fields):
-                    field = parsed.fields[index]
-
-            # Identifier Path
-            self._refactor(field, old_tables)
-            
-            index += 1
-
-        if parsed.where_expr is not None:
-            self._refactor(parsed.where_expr, old_tables)
+                columns = self._expand_wildcard(field.expr, old_tables)
+            if not columns:
+                fields.append(field)
+                continue
+            expanded.extend(columns)
+            if needed is not None:
+                # Only the columns read by the consumers of this query
+                columns = [column for column in columns
+                           if column.expr.names[-1].value.lower() in needed]
+            fields.extend(columns)
+        if expanded:
+            # A SELECT needs at least one column
+            fields = fields or expanded[:1]
+
+        fields = [self._refactor(field, old_tables) for field in fields]
+
+        where_expr = parsed.where_expr
+        if where_expr is not None:
+            where_expr = self._refactor(where_expr, old_tables)
+
+        return _replace(parsed, comments=comments, from_tables=from_tables,
+                        fields=_node_list(parsed.fields, fields),
+                        where_expr=where_expr)
         
+    def _expand_wildcard(self, wildcard:SQLWildcardPath, old_tables:dict):
+        """Fields for the known columns of a wildcard, without its EXCEPT."""
+        if len(old_tables) == 1 or len(wildcard.names) == 0:
+            table_alias = None
+            column_knowledge = self._get_column_knowledge(old_tables)
+        else:
+            table_alias = wildcard.names[0].value
+            table = None
+            for t, a in old_tables.items():
+                if a == table_alias:
+                    table = t
+                    break
+            column_knowledge = self._get_column_knowledge({table: table_alias})
+
+        # Omit columns in EXCEPT
+        except_ids = [column_id.value for column_id in wildcard.except_ids]
+        prefix = [SQLIdentifier(table_alias)] if table_alias else []
+        return [SQLField(
+                    SQLIdentifierPath(SQLNodeList(prefix + [SQLIdentifier(column_name)])),
+                    None, []
+                )
+                for column_name in column_knowledge.keys()
+                if column_name not in except_ids]
+
+    def _needed_columns(self, parsed:SQLSelect):
+        """Columns of a CTE or subquery read by the rest of the statement,
+        None if all are kept."""
+        if not self._prune_wildcards:
+            return None
+        name = self._symbols.derived(parsed)
+        if name is None:
+            return None
+        return self._symbols.reads(name)
+
     def _refactor_from(self, parsed:SQLFrom):
         if parsed is None:
-            return
+            return parsed
 
         tables = {}
-        if isinstance(parsed.base, SQLNamedTable):
-            table_id = parsed.base.table.names[0].value
-            alias = None if parsed.base.alias is None else parsed.base.alias.alias.value
+        base = parsed.base
+        if isinstance(base, SQLNamedTable):
+            table_id = base.table.names[0].value
+            alias = None if base.alias is None else base.alias.alias.value
             tables[table_id] = alias
-            self._refactor(parsed.base)
-        elif isinstance(parsed.base, SQLSubSelect):
-            sub_select = parsed.base
-            self._refactor(sub_select)
+            base = self._refactor(base)
+        elif isinstance(base, SQLSubSelect):
+            sub_select = base = self._refactor(base)
             if sub_select.alias:
                 table_alias = sub_select.alias.alias.value
                 table_name = table_alias
@@ -252,16 +428,17 @@ class Refactor:
                     'preserved' : True
                 }
             }
-            self._knowledge = dict(self._knowledge, **additional_knowledge)
+            self._knowledge.update(additional_knowledge)
 
+        joins = []
         for join_item in parsed.joins:
             if isinstance(join_item.table, SQLNamedTable):
                 table_id = join_item.table.table.names[0].value
                 alias = None if join_item.table.alias is None else join_item.table.alias.alias.value
                 tables[table_id] = alias
             elif isinstance(join_item.table, SQLSubSelect):
-                sub_select = join_item.table
-                self._refactor(sub_select, tables)
+                sub_select = self._refactor(join_item.table, tables)
+                join_item = _replace(join_item, table=sub_select)
                 if sub_select.alias:
                     table_alias = sub_select.alias.alias.value
                     table_name = table_alias
@@ -293,103 +470,123 @@ class Refactor:
                         'preserved' : True
                     }
                 }
-                self._knowledge = dict(self._knowledge, **additional_knowledge)
+                self._knowledge.update(additional_knowledge)
                 tables[table_name] = table_alias
-            self._refactor(join_item, tables)
+            joins.append(self._refactor(join_item, tables))
+
+        return _replace(parsed, base=base, joins=_node_list(parsed.joins, joins))
 
     def _refactor_named_table(self, parsed:SQLNamedTable):
         table_id = parsed.table.names[-1].value
-        if table_id in self._knowledge.keys():
+        if table_id in self._knowledge:
             if not self._knowledge[table_id]['preserved']:
                 table_id = self._knowledge[table_id]['new_table']
-        parsed.table.names[-1].value = '`' + table_id.strip('`') + '`'
+                if table_id.strip('`') != parsed.table.names[-1].value.strip('`'):
+                    self._record('table', old=parsed.table.names[-1].value.strip('`'),
+                                 new=table_id.strip('`'))
+        names = list(parsed.table.names[:-1]) + [SQLIdentifier('`' + table_id.strip('`') + '`')]
+        return replace(parsed, table=replace(parsed.table, names=SQLNodeList(names)))
 
     def _refactor_field(self, parsed:SQLField, tables:dict):
         if isinstance(parsed.expr, SQLIdentifierPath):
             if len(tables) == 0: # no tables found in knowledge
-                return
+                return parsed
             if isinstance(parsed.expr, SQLWildcardPath):
-                return
+                return parsed
+
+            relevant_tables = self._relevant_tables(parsed.expr, tables)
 
-            first_name = parsed.expr.names[0].value
-            relevant_tables = tables
-            
-            # check whether first_name is table's alias
-            for table_id, alias in tables.items():
-                if alias == first_name:
-                    alias = alias if alias else table_id
-                    relevant_tables = {table_id : alias}
-                    break
-            
             column_knowledge = self._get_column_knowledge(relevant_tables)
             column_type_knowledge = self._get_column_type_knowledge(relevant_tables)
 
             old_column_name = parsed.expr.names[-1].value
 
             if old_column_name not in column_knowledge.keys():
-                parsed.comments.append(self.COMMENT_COLUMN_NOT_FOUND.format(",".join(relevant_tables.keys()), old_column_name))
-                return
+                comment = self.COMMENT_COLUMN_NOT_FOUND.format(",".join(relevant_tables.keys()), old_column_name)
+                self._record('column_not_found', tables=list(relevant_tables), column=old_column_name)
+                return replace(parsed, comments=list(parsed.comments or []) + [comment])
                 
             new_column_name_path = column_knowledge[old_column_name].split('.')
             new_column_name = new_column_name_path[-1]
+            if old_column_name != new_column_name:
+                self._record_column(relevant_tables, old_column_name, new_column_name)
 
-            new_column_name_identifier_path = [SQLIdentifier(name) for name in new_column_name_path]
-            parsed.expr.names = SQLNodeList(new_column_name_identifier_path)
+            new_column_name_identifier_path:SQLNodeList[SQLIdentifier] = SQLNodeList([SQLIdentifier(name) for name in new_column_name_path])
+            column = replace(parsed.expr, names=new_column_name_identifier_path)
+            cast_expr = None
 
             if old_column_name in (column_type_knowledge.keys()):
                 new_column_type = column_type_knowledge[old_column_name]
                 if new_column_type:
-                    parsed.expr = SQLCAST(name='CAST', expr=SQLIdentifierPath(parsed.expr.names), type=SQLConcreteType(new_column_type))
+                    self._record_cast(relevant_tables, old_column_name, new_column_type)
+                    cast_expr = SQLCAST(name='CAST', expr=column, type=SQLConcreteType(new_column_type))
                
 
             # add alias for column
-            if parsed.alias is None:
+            alias = parsed.alias
+            if alias is None:
                 if old_column_name != new_column_name:
-                    parsed.alias = SQLAlias(SQLIdentifier(old_column_name))
-            elif new_column_name == parsed.alias.alias.value:
-                parsed.alias = None
+                    alias = SQLAlias(SQLIdentifier(old_column_name))
+            elif new_column_name == alias.alias.value:
+                alias = None
+
+            return replace(parsed, expr=column if cast_expr is None else cast_expr, alias=alias)
 
         else:
-            self._refactor(parsed.expr, tables)
+            return _replace(parsed, expr=self._refactor(parsed.expr, tables))
 
     def _refactor_join(self, parsed:SQLJoin, tables:dict):
-        if isinstance(parsed.table, SQLNamedTable):
-            self._refactor(parsed.table)
-        if parsed.join_expr:
-            self._refactor(parsed.join_expr, tables)
+        table = parsed.table
+        if isinstance(table, SQLNamedTable):
+            table = self._refactor(table)
+        join_expr = parsed.join_expr
+        if join_expr:
+            join_expr = self._refactor(join_expr, tables)
+        return _replace(parsed, table=table, join_expr=join_expr)
 
     def _refactor_identifier_path(self, parsed:SQLIdentifierPath, tables):
         if tables is None:
-            return
+            return parsed
         if isinstance(parsed, SQLWildcardPath):
-            return
+            return parsed
 
-        first_name = parsed.names[0].value
-        relevant_tables = tables
+        relevant_tables = self._relevant_tables(parsed, tables)
 
-        # check whether first_name is table's alias
-        for table_id, alias in tables.items():
-            if alias == first_name:
-                alias = alias if alias else table_id
-                relevant_tables = {table_id : alias}
-                break
-        
         column_knowledge = self._get_column_knowledge(relevant_tables)
         old_column_name = parsed.names[-1].value
         if old_column_name not in column_knowledge.keys():
-            return
+            return parsed
         new_column_name_path = column_knowledge[old_column_name].split('.')
+        if old_column_name != new_column_name_path[-1]:
+            self._record_column(relevant_tables, old_column_name, new_column_name_path[-1])
         new_column_name_identifier_path = [SQLIdentifier(name) for name in new_column_name_path]
-        parsed.names = SQLNodeList(new_column_name_identifier_path)
+        return replace(parsed, names=SQLNodeList(new_column_name_identifier_path))
+
+    def _relevant_tables(self, path:SQLIdentifierPath, tables:dict):
+        """The table a column path is qualified with by alias, if it is one
+        of tables, otherwise all of tables."""
+        first_name = path.names[0].value
+        symbol = self._symbols.get(path)
+        if symbol is not None:
+            if symbol.qualified and tables.get(symbol.source) == first_name:
+                return {symbol.source : first_name}
+            if not symbol.qualified:
+                return tables
+
+        # Not resolved up front (such as fields expanded from a wildcard)
+        for table_id, alias in tables.items():
+            if alias == first_name:
+                return {table_id : alias}
+        return tables
 
     def _refactor_create(self, parsed:SQLCreate):
-        self._refactor(parsed.query)
+        query = self._refactor(parsed.query)
 
         # Add CTE into current knowledge
         cte_table = parsed.table.table.names[-1].value
         column_knowledge = {}
 
-        select_statement = parsed.query.select
+        select_statement = query.select
         while True:
             if isinstance(select_statement, SQLSelect):
                 break
@@ -407,19 +604,23 @@ class Refactor:
                 column_knowledge[field.alias.alias.value] = None
             else:
                 column_knowledge[field.expr.names[-1].value] = None
-        self._knowledge[cte_table] = {
+        self._session[cte_table] = {
             'new_table' : None,
             'column_knowledge' : column_knowledge,
             'preserved' : True
         }
 
+        return _replace(parsed, query=query)
+
     def _refactor_union(self, parsed:SQLSetOp):
-        self._refactor(parsed.left)
-        self._refactor(parsed.right)
+        return _replace(parsed, left=self._refactor(parsed.left),
+                        right=self._refactor(parsed.right))
 
     def _refactor_node(self, parsed:SQLNode, tables:dict=None):
-        for _, val in parsed.children():
-            self._refactor(val, tables)
+        if isinstance(parsed, SQLNodeList):
+            return _node_list(parsed, [self._refactor(val, tables) for val in parsed])
+        return _replace(parsed, **{name : self._refactor(val, tables)
+                                   for name, val in parsed.children()})
 
     def _get_tables_and_alias(self, from_tables:SQLFrom) -> dict:
         tables = {}
@@ -430,7 +631,7 @@ class Refactor:
             
         if isinstance(from_tables.base, SQLNamedTable):
             table_id = from_tables.base.table.names[-1].value
-            if table_id in self._knowledge.keys():
+            if table_id in self._knowledge:
                 tables[table_id] = None if from_tables.base.alias is None \
                                     else from_tables.base.alias.alias.value
             else:
@@ -447,7 +648,7 @@ class Refactor:
         for join_item in from_tables.joins:
             if isinstance(join_item.table, SQLNamedTable):
                 table_id = join_item.table.table.names[-1].value
-                if table_id in self._knowledge.keys():
+                if table_id in self._knowledge:
                     tables[table_id] = None if join_item.table.alias is None \
                                         else join_item.table.alias.alias.value
                 else:
@@ -465,17 +666,52 @@ class Refactor:
         not_found_tables = set(not_found_tables)
         return tables, not_found_tables
 
+    def _compile(self, table):
+        """Column maps of a knowledge entry, built once per entry.
+
+        The maps are kept with the scope (or session) the entry belongs to
+        and go with it, so a CTE or subselect that shadows a table gets its
+        own maps; entries must not be changed in place once used.
+        """
+        for knowledge, compiled_knowledge in zip(self._knowledge.maps, self._compiled):
+            if table in knowledge:
+                break
+        else:
+            return None
+        entry = knowledge[table]
+        if entry is None:
+            return None
+        compiled = compiled_knowledge.get(table)
+        if compiled is None or compiled[0] is not entry:
+            columns = {old_column : old_column if entry['preserved'] else new_column
+                       for old_column, new_column in entry['column_knowledge'].items()
+                       if old_column}
+            column_types = entry.get('column_type_knowledge') or {}
+            compiled = (entry, columns, column_types)
+            compiled_knowledge[table] = compiled
+        return compiled
+
+    def _cached_lookup(self, kind, tables:dict, build):
+        """Lookups resolved for the aliases of the current SELECT are kept
+        until the SELECT is done."""
+        if not self._lookups:
+            return build(tables)
+        key = (kind,) + tuple(tables.items())
+        lookups = self._lookups[-1]
+        if key not in lookups:
+            lookups[key] = build(tables)
+        return lookups[key]
+
     def _get_column_knowledge(self, tables:dict):
+        return self._cached_lookup('columns', tables, self._build_column_knowledge)
+
+    def _build_column_knowledge(self, tables:dict):
         column_knowledge = {}
         for table, alias in tables.items():
-            if table not in self._knowledge.keys():
+            compiled = self._compile(table)
+            if compiled is None:
                 continue
-            column_knowledge_from_table = dict(filter(lambda elem: elem[0] and elem[0] != '', self._knowledge[table]['column_knowledge'].items()))
-            if self._knowledge[table]['preserved']:
-                column_knowledge_from_table = {
-                                                old_column : old_column
-                                                for old_column, _ in column_knowledge_from_table.items()
-                                            }
+            column_knowledge_from_table = compiled[1]
             if alias and alias[0] != '*':
                     column_knowledge_from_table = {
                                                     old_column : '{}.{}'.format(alias, new_column)
@@ -486,11 +722,39 @@ class Refactor:
         return column_knowledge
     
     def _get_column_type_knowledge(self, tables:dict):
+        return self._cached_lookup('types', tables, self._build_column_type_knowledge)
+
+    def _build_column_type_knowledge(self, tables:dict):
         column_type_knowledge = {}
-        for table, alias in tables.items():
-            if table not in self._knowledge.keys() or ('column_type_knowledge' not in self._knowledge[table].keys()):
+        for table, _ in tables.items():
+            compiled = self._compile(table)
+            if compiled is None:
                 continue
-            column_type_knowledge_from_table = copy.copy(self._knowledge[table]['column_type_knowledge'])
-            column_type_knowledge.update(column_type_knowledge_from_table)
+            column_type_knowledge.update(compiled[2])
             
         return column_type_knowledge
+
+
+def refactor_text(sql:str, knowledge, prune_wildcards:bool=False, cache=None) -> str:
+    """Refactor one script with a fresh Refactor.
+
+    Tables created by the script are only seen by the script itself, so
+    the same knowledge can be shared by any number of calls (and
+    processes).
+    """
+    refactor = Refactor(knowledge, prune_wildcards, cache)
+    refactor.refactor(sql)
+    return refactor.result()
+
+
+def refactor_stream(sql:str, knowledge, outp, prune_wildcards:bool=False, cache=None) -> bool:
+    """Like refactor_text(), but written to outp one statement at a time."""
+    refactor = Refactor(knowledge, prune_wildcards, cache)
+    return refactor.write(sql, outp)
+
+
+def impact_text(sql:str, knowledge, prune_wildcards:bool=False) -> list:
+    """Refactor.impact() of one script with a fresh Refactor."""
+    refactor = Refactor(knowledge, prune_wildcards)
+    return refactor.impact(sql)
+
@@ -0,0 +1,156 @@
+"""Refactor many scripts, in a process pool if asked, one result per file.
+
+Each worker loads the knowledge once; a compiled knowledge file is memory
+mapped, so the workers share its pages rather than each parsing the JSON.
+With a cache, each worker opens its own connection to the SQLite file.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from sql_refactor import refactor_text, refactor_stream, impact_text
+from sql_refactor.knowledge import load_knowledge
+from sql_refactor.cache import RefactorCache
+
+
+_knowledge = None
+_cache = None
+
+
+def _load(knowledge_path, cache_path=None):
+    global _knowledge, _cache
+    _knowledge = load_knowledge(knowledge_path)
+    _cache = cache_path and RefactorCache(cache_path)
+
+
+def _refactor_one(sql, prune_wildcards=False):
+    """(result, None, hits, misses) or (None, error message, hits, misses)
+    -- a bad script must not stop the others -- with the cache hits and
+    misses of the script."""
+    hits, misses = _counts()
+    try:
+        result = refactor_text(sql, _knowledge, prune_wildcards, _cache), None
+    except Exception as e:
+        result = None, _error(e)
+    finally:
+        if _cache:
+            _cache.commit()
+    after_hits, after_misses = _counts()
+    return result + (after_hits - hits, after_misses - misses)
+
+
+def _impact_one(sql, prune_wildcards=False):
+    """(changes, None, 0, 0) or (None, error message, 0, 0), like
+    _refactor_one()."""
+    try:
+        return impact_text(sql, _knowledge, prune_wildcards), None, 0, 0
+    except Exception as e:
+        return None, _error(e), 0, 0
+
+
+def _counts():
+    return (_cache.hits, _cache.misses) if _cache else (0, 0)
+
+
+def _error(e):
+    return '{}: {}'.format(type(e).__name__, e)
+
+
+def refactor_to(outp, sql, knowledge, prune_wildcards=False, cache=None):
+    """Refactor sql straight to outp, a statement at a time.
+
+    The statements before an error have already been written.
+
+    Returns: (None, error), like refactor_all()
+    """
+    try:
+        refactor_stream(sql, knowledge, outp, prune_wildcards, cache)
+        return None, None
+    except Exception as e:
+        return None, _error(e)
+
+
+def refactor_all(sqls, knowledge_path, jobs=1, knowledge=None,
+                 prune_wildcards=False, cache_path=None, stats=None):
+    """Refactor each of sqls, in order.
+
+    knowledge, if already loaded from knowledge_path, is used when running
+    in this process. cache_path is a RefactorCache file; the hits and
+    misses of all the workers are added to stats['hits'] and
+    stats['misses'], if given.
+
+    Returns: list of (result, error), one per script
+    """
+    results = _map(_refactor_one, sqls, knowledge_path, jobs, knowledge,
+                   prune_wildcards, cache_path)
+    if stats is not None:
+        stats['hits'] = stats.get('hits', 0) + sum(r[2] for r in results)
+        stats['misses'] = stats.get('misses', 0) + sum(r[3] for r in results)
+    return [(result, error) for result, error, _, _ in results]
+
+
+def impact_all(sqls, knowledge_path, jobs=1, knowledge=None,
+               prune_wildcards=False):
+    """Refactor.impact() of each of sqls, in order, like refactor_all().
+
+    Returns: list of (changes, error), one per script
+    """
+    results = _map(_impact_one, sqls, knowledge_path, jobs, knowledge,
+                   prune_wildcards)
+    return [(changes, error) for changes, error, _, _ in results]
+
+
+def _map(worker, sqls, knowledge_path, jobs, knowledge, prune_wildcards,
+         cache_path=None):
+    sqls = list(sqls)
+    if jobs > 1 and len(sqls) > 1:
+        with ProcessPoolExecutor(jobs, initializer=_load,
+                                 initargs=(knowledge_path, cache_path)) as pool:
+            chunksize = max(1, len(sqls) // (jobs * 4))
+            return list(pool.map(worker, sqls, repeat(prune_wildcards),
+                                 chunksize=chunksize))
+
+    global _knowledge, _cache
+    _knowledge = knowledge if knowledge is not None \
+        else load_knowledge(knowledge_path)
+    _cache = cache_path and RefactorCache(cache_path)
+    try:
+        return [worker(sql, prune_wildcards) for sql in sqls]
+    finally:
+        if _cache:
+            _cache.close()
+        _knowledge = _cache = None
+
+
+def impact_report(names, results):
+    """JSON-ready report of impact_all() results for the files names.
+
+    Files without changes are left out. The renamed tables and columns and
+    the casts are also listed once for all the files.
+    """
+    files = []
+    tables = {}
+    columns = {}
+    casts = {}
+    for name, (statements, error) in zip(names, results):
+        if error:
+            files.append({'file': name, 'error': error})
+            continue
+        if statements:
+            files.append({'file': name, 'statements': statements})
+        for statement in statements:
+            for change in statement['changes']:
+                if change['kind'] == 'table':
+                    tables[change['old']] = change['new']
+                elif change['kind'] == 'column':
+                    columns['{}.{}'.format(change['table'], change['old'])] = \
+                        change['new']
+                elif change['kind'] == 'cast':
+                    casts['{}.{}'.format(change['table'], change['column'])] = \
+                        change['type']
+    return {
+        'files': files,
+        'tables': dict(sorted(tables.items())),
+        'columns': dict(sorted(columns.items())),
+        'casts': dict(sorted(casts.items())),
+    }
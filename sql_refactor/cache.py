@@ -0,0 +1,149 @@
+"""Cache of refactored statements, persisted in SQLite.
+
+A statement is stored under the hash of its text (with insignificant
+whitespace removed) along with the names of the knowledge tables consulted
+while refactoring it -- including the ones that were not found -- and a
+digest of their entries. The cached SQL is used only while those entries are
+unchanged, so editing the knowledge of a table only invalidates the
+statements that looked it up.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+from collections.abc import Mapping
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS statements (
+    key TEXT PRIMARY KEY,
+    tables TEXT NOT NULL,
+    knowledge TEXT NOT NULL,
+    sql TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+'''
+
+# Bump when a change to Refactor changes its output
+VERSION = 1
+
+# Comments and quoted strings are kept exactly as written
+_VERBATIM = re.compile(r"""('''[\s\S]*?'''|\"\"\"[\s\S]*?\"\"\"|"""
+                       r"""'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|`[^`]*`|"""
+                       r"""--[^\n]*|#[^\n]*|/\*[\s\S]*?\*/)""")
+
+
+def statement_key(command, prune_wildcards=False):
+    """Hash of a statement, the same however it is indented."""
+    parts = _VERBATIM.split(command.strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r' ?\n\s*', '\n', re.sub(r'[^\S\n]+', ' ', parts[i]))
+    text = '{}:{}:{}'.format(VERSION, int(prune_wildcards), ''.join(parts))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def knowledge_digest(tables, knowledge):
+    """Digest of the entries of tables in knowledge, None for the missing."""
+    entries = [[table, knowledge.get(table)] for table in tables]
+    return hashlib.sha1(json.dumps(entries, sort_keys=True)
+                        .encode('utf-8')).hexdigest()
+
+
+class Recorder(Mapping):
+    """Read-only view of a mapping that records the keys looked up."""
+
+    def __init__(self, mapping, consulted):
+        self._mapping = mapping
+        self.consulted = consulted
+
+    def __getitem__(self, key):
+        self.consulted.add(key)
+        return self._mapping[key]
+
+    def __contains__(self, key):
+        self.consulted.add(key)
+        return key in self._mapping
+
+    def __iter__(self):
+        return iter(self._mapping)
+
+    def __len__(self):
+        return len(self._mapping)
+
+
+class RecordingDict(dict):
+    """A dict that records the keys looked up."""
+
+    def __init__(self, consulted):
+        super().__init__()
+        self.consulted = consulted
+
+    def __getitem__(self, key):
+        self.consulted.add(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.consulted.add(key)
+        return super().__contains__(key)
+
+
+class CachedStatement:
+    """A refactored statement, already formatted."""
+
+    def __init__(self, sql):
+        self.sql = sql
+
+    def as_sql(self):
+        return self.sql
+
+    def write_sql(self, outp):
+        outp.write(self.sql)
+
+
+class RefactorCache:
+    """Refactored statements by statement key, persisted in SQLite."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def get(self, key, knowledge):
+        """(sql, created) if key is cached and the knowledge it consulted is
+        unchanged, otherwise None.
+
+        created are the knowledge entries the statement adds, such as the
+        columns of a table it creates.
+        """
+        row = self.conn.execute('SELECT tables, knowledge, sql, created '
+                                'FROM statements WHERE key = ?',
+                                (key,)).fetchone()
+        if row is None or \
+                knowledge_digest(json.loads(row[0]), knowledge) != row[1]:
+            return None
+        self.hits += 1
+        return row[2], json.loads(row[3])
+
+    def put(self, key, tables, knowledge, sql, created):
+        """Store the refactored sql of key, with the tables it consulted in
+        knowledge (as it was before the statement).
+
+        Counted as a miss: only the statements that parse are stored, so a
+        statement split at a ';' in a string is not counted for each part.
+        """
+        self.misses += 1
+        tables = sorted(table for table in tables if isinstance(table, str))
+        self.conn.execute('INSERT OR REPLACE INTO statements '
+                          'VALUES (?, ?, ?, ?, ?)',
+                          (key, json.dumps(tables),
+                           knowledge_digest(tables, knowledge), sql,
+                           json.dumps(created, sort_keys=True)))
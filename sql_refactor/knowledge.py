@@ -0,0 +1,183 @@
+"""Knowledge maps for Refactor: validation and a compiled binary format.
+
+A knowledge map is a dict of table name to entry:
+
+    {
+        'new_table': 'new_name' or None,
+        'column_knowledge': {'old_column': 'new_column' or None, ...},
+        'column_type_knowledge': {'old_column': 'TYPE' or None, ...},  # optional
+        'preserved': True or False,
+    }
+
+compile_knowledge() writes a validated map to a file that is memory mapped
+by KnowledgeFile, so each process only decodes the entries it looks up and
+the operating system shares the pages between processes.
+
+File layout (little endian):
+
+    magic         8 bytes
+    count         u32
+    index         count x (u64 key offset, u32 key length,
+                           u64 value offset, u32 value length), sorted by key
+    keys, values  UTF-8 table names and JSON entries
+"""
+
+import json
+import mmap
+import struct
+from collections.abc import Mapping
+
+
+MAGIC = b'SQLKNOW1'
+_COUNT = struct.Struct('<I')
+_RECORD = struct.Struct('<QIQI')
+
+REQUIRED_KEYS = ('new_table', 'column_knowledge', 'preserved')
+
+
+class KnowledgeError(ValueError):
+    pass
+
+
+def _check_names(table, key, names, allow_none_values=True):
+    if not isinstance(names, dict):
+        raise KnowledgeError('{}: {} must be an object'.format(table, key))
+    for old, new in names.items():
+        if not isinstance(old, str):
+            raise KnowledgeError('{}: {} has a non-string column {!r}'.format(
+                table, key, old))
+        if not (isinstance(new, str) or (new is None and allow_none_values)):
+            raise KnowledgeError('{}: {}.{} must be a string or null'.format(
+                table, key, old))
+
+
+def validate(knowledge):
+    """Check knowledge against the schema, raising KnowledgeError."""
+
+    if not isinstance(knowledge, dict):
+        raise KnowledgeError('knowledge must be an object of tables')
+
+    for table, entry in knowledge.items():
+        if not isinstance(entry, dict):
+            raise KnowledgeError('{}: entry must be an object'.format(table))
+        for key in REQUIRED_KEYS:
+            if key not in entry:
+                raise KnowledgeError('{}: missing {}'.format(table, key))
+        if not (entry['new_table'] is None or
+                isinstance(entry['new_table'], str)):
+            raise KnowledgeError('{}: new_table must be a string or null'
+                                 .format(table))
+        if not isinstance(entry['preserved'], bool):
+            raise KnowledgeError('{}: preserved must be true or false'
+                                 .format(table))
+        _check_names(table, 'column_knowledge', entry['column_knowledge'])
+        if 'column_type_knowledge' in entry:
+            _check_names(table, 'column_type_knowledge',
+                         entry['column_type_knowledge'])
+
+    return knowledge
+
+
+def compile_knowledge(knowledge, path):
+    """Validate knowledge and write it to path in the compiled format."""
+
+    validate(knowledge)
+    keys = sorted(knowledge)
+    key_blobs = [key.encode('utf-8') for key in keys]
+    value_blobs = [json.dumps(knowledge[key], separators=(',', ':'))
+                   .encode('utf-8') for key in keys]
+
+    offset = len(MAGIC) + _COUNT.size + _RECORD.size * len(keys)
+    records = []
+    for key_blob in key_blobs:
+        records.append([offset, len(key_blob)])
+        offset += len(key_blob)
+    for record, value_blob in zip(records, value_blobs):
+        record.extend([offset, len(value_blob)])
+        offset += len(value_blob)
+
+    with open(path, 'wb') as outp:
+        outp.write(MAGIC)
+        outp.write(_COUNT.pack(len(keys)))
+        for record in records:
+            outp.write(_RECORD.pack(*record))
+        for key_blob in key_blobs:
+            outp.write(key_blob)
+        for value_blob in value_blobs:
+            outp.write(value_blob)
+
+
+class KnowledgeFile(Mapping):
+    """Read-only knowledge map backed by a compiled, memory mapped file.
+
+    Entries are decoded on first lookup and then kept, so the same entry
+    object is returned every time.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as inp:
+            self._data = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise KnowledgeError('{}: not a compiled knowledge file'.format(
+                path))
+        self._count, = _COUNT.unpack_from(self._data, len(MAGIC))
+        self._entries = {}
+
+    def _record(self, i):
+        return _RECORD.unpack_from(
+            self._data, len(MAGIC) + _COUNT.size + _RECORD.size * i)
+
+    def _key(self, i):
+        key_offset, key_len, _, _ = self._record(i)
+        return self._data[key_offset:key_offset + key_len]
+
+    def __getitem__(self, table):
+        if table in self._entries:
+            return self._entries[table]
+
+        # Binary search of the sorted index, comparing UTF-8 bytes -- the
+        # same order as sorting the names.
+        key = table.encode('utf-8') if isinstance(table, str) else None
+        lo, hi = 0, self._count
+        while key is not None and lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if key is None or lo == self._count or self._key(lo) != key:
+            raise KeyError(table)
+
+        _, _, value_offset, value_len = self._record(lo)
+        entry = json.loads(self._data[value_offset:value_offset + value_len]
+                           .decode('utf-8'))
+        self._entries[table] = entry
+        return entry
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key(i).decode('utf-8')
+
+    def __len__(self):
+        return self._count
+
+
+def load_knowledge(path):
+    """Load a compiled knowledge file, or validate and load a JSON one.
+
+    Any KnowledgeError names path.
+    """
+
+    with open(path, 'rb') as inp:
+        compiled = inp.read(len(MAGIC)) == MAGIC
+    if compiled:
+        return KnowledgeFile(path)
+    with open(path, encoding='utf-8') as inp:
+        try:
+            knowledge = json.load(inp)
+        except ValueError as e:
+            raise KnowledgeError('{}: not valid JSON: {}'.format(path, e))
+    try:
+        return validate(knowledge)
+    except KnowledgeError as e:
+        raise KnowledgeError('{}: {}'.format(path, e))
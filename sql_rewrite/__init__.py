@@ -18,6 +18,7 @@ from .netezza import convert as netezza_convert
 from .hive import convert as hive_convert
 from .bigquery_cleanup import cleanup
 from .stats import tables, tables_to_graph
+from .graph import find_cycles, ReachabilityIndex
 
 MODES = [
     'NETEZZA',
@@ -0,0 +1,284 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from collections import namedtuple
+
+from sql_parser.node import SQLNode
+from sql_parser.ident import SQLIdentifierPath, SQLWildcardPath
+from sql_parser.query import SQLNamedTable, SQLFunctionTable
+from sql_parser.query_impl import (SQLWithSelect, SQLSelect, SQLSetOp,
+                                   SQLOrderedQuery, SQLSubSelect, SQLFrom)
+from sql_parser.dml import SQLCreate, SQLInsert, SQLUpdate
+from sql_parser.parser import SQLScript
+
+
+class ColumnDependency(namedtuple('ColumnDependency', ['dest', 'src'])):
+    """dest is derived from the src columns, both as 'table.column'.
+
+    Like TableDependency, so tables_to_graph() accepts either.
+    """
+    pass
+
+
+class _Table:
+    """A table read from the warehouse; any column name resolves."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def lookup(self, column):
+        return {'{}.{}'.format(self.name, column)}
+
+    def expand(self, except_ids):
+        return [('*', {'{}.*'.format(self.name)})]
+
+    def sources(self):
+        return {'{}.*'.format(self.name)}
+
+
+class _Values:
+    """A value, such as an UNNEST element, that derives from some columns."""
+
+    def __init__(self, name, sources):
+        self.name = name
+        self.srcs = sources
+
+    def lookup(self, column):
+        return self.srcs
+
+    def expand(self, except_ids):
+        return [(self.name, self.srcs)]
+
+    def sources(self):
+        return self.srcs
+
+
+class _Derived:
+    """Output columns of a query, in order, each with its sources."""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.by_name = {name.lower(): srcs for name, srcs in columns}
+
+    def lookup(self, column):
+        return self.by_name.get(column.lower())
+
+    def expand(self, except_ids):
+        return [(name, srcs) for name, srcs in self.columns
+                if name.lower() not in except_ids]
+
+    def sources(self):
+        return set().union(*(srcs for _, srcs in self.columns))
+
+
+class _Scope:
+    """The tables of a FROM clause by alias, within any enclosing query."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.relations = []
+
+    def add(self, alias, relation):
+        self.relations.append((alias.lower(), relation))
+
+    def alias(self, name):
+        scope = self
+        while scope:
+            for alias, relation in scope.relations:
+                if alias == name.lower():
+                    return relation
+            scope = scope.parent
+        return None
+
+    def resolve(self, names):
+        """Source columns of a column reference."""
+
+        relation = self.alias(names[0])
+        if relation and len(names) > 1:
+            return relation.lookup(names[1]) or set()
+        if relation:
+            return relation.sources()
+
+        # Innermost query first. A derived column wins; otherwise the column
+        # could come from any of the tables, so all are kept -- pruning
+        # must not drop a column that may be used.
+        scope = self
+        while scope:
+            found = set()
+            for _, relation in scope.relations:
+                if isinstance(relation, _Derived):
+                    srcs = relation.lookup(names[0])
+                    if srcs is not None:
+                        return srcs
+                elif isinstance(relation, _Table):
+                    found.update(relation.lookup(names[0]))
+            if found:
+                return found
+            scope = scope.parent
+        return set()
+
+
+def _expr_sources(expr, scope, ctes):
+    if isinstance(expr, SQLWildcardPath):
+        return set()
+
+    if isinstance(expr, SQLIdentifierPath):
+        return scope.resolve([name.value for name in expr.names])
+
+    # Subqueries within expressions, correlated or not
+    if isinstance(expr, SQLWithSelect):
+        return _query(expr, scope, ctes).sources()
+
+    srcs = set()
+    if isinstance(expr, SQLNode):
+        for _, child in expr.children():
+            srcs.update(_expr_sources(child, scope, ctes))
+    return srcs
+
+
+def _from(expr, scope, ctes):
+    if isinstance(expr, SQLFrom):
+        _from(expr.base, scope, ctes)
+        for join in expr.joins:
+            _from(join.table, scope, ctes)
+
+    elif isinstance(expr, SQLNamedTable):
+        name = str(expr.table)
+        relation = ctes.get(name.lower()) or _Table(name)
+        alias = expr.alias.alias if expr.alias else expr.table.names[-1]
+        scope.add(alias.value, relation)
+
+    elif isinstance(expr, SQLSubSelect):
+        relation = _query(expr.query, scope.parent, ctes)
+        if expr.alias:
+            scope.add(expr.alias.alias.value, relation)
+        else:
+            scope.relations.append(('', relation))
+
+    elif isinstance(expr, SQLFunctionTable):
+        srcs = _expr_sources(expr.expr, scope, ctes)
+        if expr.alias:
+            name = expr.alias.alias.value
+            scope.add(name, _Values(name, srcs))
+
+
+def _query(expr, outer, ctes):
+    """Resolve the output columns of a query (_Derived)."""
+
+    if isinstance(expr, SQLWithSelect):
+        if expr.tables:
+            # Each common table expression is resolved once, and every
+            # reference to it shares the result.
+            ctes = dict(ctes)
+            for table, sql in zip(expr.tables, expr.sqls):
+                ctes[str(table).lower()] = _query(sql, outer, ctes)
+        return _query(expr.select, outer, ctes)
+
+    if isinstance(expr, SQLSelect):
+        scope = _Scope(outer)
+        if expr.from_tables:
+            _from(expr.from_tables, scope, ctes)
+
+        columns = []
+        unnamed = 0
+        for field in expr.fields:
+            if isinstance(field.expr, SQLWildcardPath):
+                except_ids = {name.value.lower()
+                              for name in field.expr.except_ids}
+                if field.expr.names:
+                    relation = scope.alias(field.expr.names[-1].value)
+                    relations = [relation] if relation else []
+                else:
+                    relations = [relation for _, relation in scope.relations]
+                for relation in relations:
+                    columns.extend(relation.expand(except_ids))
+                continue
+
+            if field.alias:
+                name = field.alias.alias.value
+            elif isinstance(field.expr, SQLIdentifierPath):
+                name = field.expr.names[-1].value
+            else:
+                # BigQuery names anonymous columns f0_, f1_, ...
+                name = 'f{}_'.format(unnamed)
+                unnamed += 1
+            columns.append((name, _expr_sources(field.expr, scope, ctes)))
+        return _Derived(columns)
+
+    if isinstance(expr, SQLSetOp):
+        left = _query(expr.left, outer, ctes)
+        right = _query(expr.right, outer, ctes)
+        return _Derived([
+            (name, srcs | (right.columns[i][1]
+                           if i < len(right.columns) else set()))
+            for i, (name, srcs) in enumerate(left.columns)
+        ])
+
+    if isinstance(expr, (SQLOrderedQuery, SQLSubSelect)):
+        return _query(expr.query, outer, ctes)
+
+    return _Derived([])
+
+
+def _target(table, names, relation):
+    """Dependencies for writing relation into the names columns of table."""
+    deps = set()
+    for name, (_, srcs) in zip(names, relation.columns):
+        deps.add(ColumnDependency(('{}.{}'.format(table, name),),
+                                  tuple(sorted(srcs))))
+    return deps
+
+
+def columns(expr):
+    """Column dependencies of the statements that write tables.
+
+    Returns: set of ColumnDependency
+    """
+
+    deps = set()
+
+    if isinstance(expr, SQLScript):
+        for cmd in expr.commands:
+            deps.update(columns(cmd))
+
+    elif isinstance(expr, SQLCreate) and expr.query:
+        relation = _query(expr.query, None, {})
+        deps.update(_target(str(expr.table.table),
+                            [name for name, _ in relation.columns],
+                            relation))
+
+    elif isinstance(expr, SQLInsert):
+        relation = _query(expr.sql, None, {})
+        if expr.fields:
+            names = [field.names[-1].value for field in expr.fields]
+        else:
+            names = [name for name, _ in relation.columns]
+        deps.update(_target(str(expr.table.table), names, relation))
+
+    elif isinstance(expr, SQLUpdate):
+        scope = _Scope()
+        _from(expr.table_name, scope, {})
+        if expr.from_tables:
+            _from(expr.from_tables, scope, {})
+        relation = _Derived([
+            (field.names[-1].value, _expr_sources(value, scope, {}))
+            for field, value in zip(expr.update_fields, expr.update_exprs)
+        ])
+        deps.update(_target(str(expr.table_name.table),
+                            [name for name, _ in relation.columns],
+                            relation))
+
+    return deps
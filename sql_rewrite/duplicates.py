@@ -0,0 +1,185 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+import hashlib
+from collections import namedtuple
+from dataclasses import fields
+
+from sql_parser.node import SQLNode, SQLNodeList
+from sql_parser.ident import SQLIdentifierPath
+from sql_parser.query import SQLNamedTable, SQLFunctionTable
+from sql_parser.query_impl import SQLWithSelect, SQLSubSelect
+
+from .stats import tables
+
+
+class Occurrence(namedtuple('Occurrence', ['source', 'kind', 'name'])):
+    """Where a query was found: the input, 'cte' or 'subquery', and the
+    CTE name or subquery alias (if any)."""
+    pass
+
+
+def _table_aliases(expr, aliases):
+    """Number the table aliases of expr in the order they appear."""
+    if isinstance(expr, (SQLNamedTable, SQLSubSelect, SQLFunctionTable)):
+        if expr.alias:
+            name = expr.alias.alias.value.lower()
+            if name not in aliases:
+                aliases[name] = '_t{}'.format(len(aliases))
+    if isinstance(expr, SQLNode):
+        for _, child in expr.children():
+            _table_aliases(child, aliases)
+    return aliases
+
+
+def _canonical(expr, aliases, ctes):
+    """The tree of expr as nested tuples, without comments, with the table
+    aliases renamed and with references to the CTEs of ctes (lower case
+    name -> fingerprint) replaced by the fingerprints of their bodies."""
+
+    if isinstance(expr, (SQLNodeList, list)):
+        return tuple(_canonical(child, aliases, ctes) for child in expr)
+
+    if isinstance(expr, SQLWithSelect):
+        # Its own CTEs shadow those of the enclosing queries
+        names = {table.value.lower() for table in expr.tables}
+        ctes = {name: cte for name, cte in ctes.items() if name not in names}
+
+    if isinstance(expr, SQLIdentifierPath) and expr.names:
+        names = [name.value for name in expr.names]
+        if len(names) > 1 and names[0].lower() in aliases:
+            names[0] = aliases[names[0].lower()]
+        canonical = [expr.get_name(), tuple(names)]
+        for field in fields(expr):
+            if field.name != 'names':
+                canonical.append(_canonical(getattr(expr, field.name),
+                                            aliases, ctes))
+        return tuple(canonical)
+
+    if isinstance(expr, (SQLNamedTable, SQLSubSelect, SQLFunctionTable)):
+        canonical = [expr.get_name()]
+        for field in fields(expr):
+            if field.name == 'alias':
+                alias = expr.alias and aliases[expr.alias.alias.value.lower()]
+                canonical.append(alias)
+            elif field.name == 'table' and _cte(expr, ctes):
+                canonical.append(('cte', _cte(expr, ctes)))
+            else:
+                canonical.append(_canonical(getattr(expr, field.name),
+                                            aliases, ctes))
+        return tuple(canonical)
+
+    if isinstance(expr, SQLNode):
+        return (expr.get_name(),) + tuple(
+            _canonical(getattr(expr, field.name), aliases, ctes)
+            for field in fields(expr)
+            if field.name != 'comments')
+
+    return expr
+
+
+def _cte(table, ctes):
+    """Fingerprint of the CTE a SQLNamedTable refers to, if it is one."""
+    if len(table.table.names) == 1:
+        return ctes.get(table.table.names[0].value.lower())
+    return None
+
+
+def fingerprint(query, ctes=None):
+    """Structural hash of a query, ignoring formatting, comments and the
+    names of table aliases.
+
+    ctes maps the lower case names of the enclosing CTEs to the
+    fingerprints of their bodies; a reference to one of them is hashed as
+    the body it stands for, not its name.
+    """
+    canonical = _canonical(query, _table_aliases(query, dict()), ctes or {})
+    return hashlib.sha1(repr(canonical).encode('utf-8')).hexdigest()
+
+
+def _size(expr):
+    if not isinstance(expr, SQLNode):
+        return 0
+    return 1 + sum(_size(child) for _, child in expr.children())
+
+
+def queries(expr, source, found, ctes=None):
+    """Collect the CTE bodies and subqueries of expr into found, a list of
+    (Occurrence, query, ctes) where ctes are the CTEs the query can refer
+    to, as for fingerprint()."""
+
+    if ctes is None:
+        ctes = dict()
+
+    if isinstance(expr, SQLWithSelect):
+        # Each CTE sees the ones before it
+        for table, sql in zip(expr.tables, expr.sqls):
+            found.append((Occurrence(source, 'cte', table.value), sql, ctes))
+            queries(sql, source, found, ctes)
+            ctes = dict(ctes)
+            ctes[table.value.lower()] = fingerprint(sql, ctes)
+        queries(expr.select, source, found, ctes)
+        return found
+
+    if isinstance(expr, SQLSubSelect):
+        name = expr.alias and expr.alias.alias.value
+        found.append((Occurrence(source, 'subquery', name), expr.query, ctes))
+
+    if isinstance(expr, SQLNode):
+        for _, child in expr.children():
+            queries(child, source, found, ctes)
+
+    return found
+
+
+def find_duplicates(found, min_count=2, min_size=10):
+    """Group the queries of found by fingerprint.
+
+    Groups of at least min_count copies of queries with at least min_size
+    tree nodes are returned, most repeated work (copies x size) first.
+
+    Returns: list of dictionaries, ready for JSON
+    """
+
+    groups = dict()
+    for occurrence, query, ctes in found:
+        groups.setdefault(fingerprint(query, ctes), []).append(
+            (occurrence, query, ctes))
+
+    duplicates = []
+    for digest, group in groups.items():
+        _, query, ctes = group[0]
+        size = _size(query)
+        if len(group) < min_count or size < min_size:
+            continue
+
+        names = sorted({occurrence.name for occurrence, _, _ in group
+                        if occurrence.name})
+        duplicates.append({
+            'fingerprint': digest[:16],
+            'count': len(group),
+            'size': size,
+            'reads': sorted({op.table for op in tables(query)
+                             if op.table.lower() not in ctes}),
+            'occurrences': [occurrence._asdict()
+                            for occurrence, _, _ in group],
+            'suggested_table': 'shared_{}_{}'.format(
+                names[0] if names else 'query', digest[:8]),
+            'sql': str(query),
+        })
+
+    duplicates.sort(key=lambda d: (-d['count'] * d['size'], d['fingerprint']))
+    return duplicates
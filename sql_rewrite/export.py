@@ -0,0 +1,107 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+import json
+from xml.sax.saxutils import escape
+
+
+def intern_graph(graph):
+    """Number the nodes of graph (dest -> set(src)) in sorted order.
+
+    Returns: (names, edges) where names[i] is the name of node i and edges
+    lists (dest, src) index pairs, sorted.
+    """
+
+    names = set(graph)
+    for srcs in graph.values():
+        names.update(srcs)
+    names = sorted(names)
+    ids = {name: i for i, name in enumerate(names)}
+
+    edges = sorted((ids[dest], ids[src])
+                   for dest, srcs in graph.items() for src in srcs)
+    return names, edges
+
+
+def write_dot(outp, graph, name='connections'):
+    """Graphviz digraph, one line per edge between quoted node names."""
+    names, edges = intern_graph(graph)
+    quoted = ['"{}"'.format(node.replace('\\', '\\\\').replace('"', '\\"'))
+              for node in names]
+    outp.write('digraph {} {{\n'.format(name))
+    for dest, src in edges:
+        outp.write('{} -> {};\n'.format(quoted[dest], quoted[src]))
+    outp.write('}\n')
+
+
+def write_jsonl(outp, graph):
+    """One JSON object per line: every node, then every edge by node id."""
+    names, edges = intern_graph(graph)
+    for i, node in enumerate(names):
+        outp.write('{{"id": {}, "name": {}}}\n'.format(i, json.dumps(node)))
+    for dest, src in edges:
+        outp.write('{{"dest": {}, "src": {}}}\n'.format(dest, src))
+
+
+def write_csr(outp, graph):
+    """Compressed sparse rows, as JSON: the sources of node i are
+    indices[indptr[i]:indptr[i + 1]].
+    """
+    names, edges = intern_graph(graph)
+
+    outp.write('{"nodes": [')
+    for i, node in enumerate(names):
+        outp.write((', ' if i else '') + json.dumps(node))
+
+    # Edges are sorted by dest, so each row is a contiguous run.
+    outp.write('],\n "indptr": [0')
+    row = 0
+    for i, (dest, _) in enumerate(edges):
+        while row < dest:
+            outp.write(', {}'.format(i))
+            row += 1
+    while row < len(names):
+        outp.write(', {}'.format(len(edges)))
+        row += 1
+
+    outp.write('],\n "indices": [')
+    for i, (_, src) in enumerate(edges):
+        outp.write((', ' if i else '') + str(src))
+    outp.write(']}\n')
+
+
+def write_graphml(outp, graph):
+    """GraphML document: a node per name, then the edges between them."""
+    names, edges = intern_graph(graph)
+    outp.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+               '<key id="name" for="node" attr.name="name" '
+               'attr.type="string"/>\n'
+               '<graph edgedefault="directed">\n')
+    for i, node in enumerate(names):
+        outp.write('<node id="n{}"><data key="name">{}</data></node>\n'
+                   .format(i, escape(node)))
+    for dest, src in edges:
+        outp.write('<edge source="n{}" target="n{}"/>\n'.format(dest, src))
+    outp.write('</graph>\n</graphml>\n')
+
+
+EXPORTERS = {
+    'dot': write_dot,
+    'jsonl': write_jsonl,
+    'csr': write_csr,
+    'graphml': write_graphml,
+}
@@ -0,0 +1,64 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from sql_parser import parse
+
+from . import convert
+from .stats import tables, TableDependency
+from .columns import columns, ColumnDependency
+
+
+def _dependencies(sql, mode, column_level):
+    """Dependencies of one SQL text, as plain sorted tuples.
+
+    Runs in a worker process; plain tuples keep the results small to send
+    back to the parent.
+    """
+    parsed = parse(sql)
+    if mode:
+        parsed = convert(mode, parsed)
+    deps = columns(parsed) if column_level else tables(parsed)
+    return sorted((dep.dest, dep.src) for dep in deps)
+
+
+def extract(sqls, mode=None, column_level=False, jobs=1):
+    """Table (or column) dependencies of many SQL texts, merged.
+
+    With jobs > 1 each text is parsed in a process pool. The merge does not
+    depend on the order the workers finish in.
+
+    Returns: sorted list of TableDependency (ColumnDependency)
+    """
+
+    sqls = list(sqls)
+    if jobs > 1 and len(sqls) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            chunksize = max(1, len(sqls) // (jobs * 4))
+            results = list(pool.map(_dependencies, sqls, repeat(mode),
+                                    repeat(column_level),
+                                    chunksize=chunksize))
+    else:
+        results = [_dependencies(sql, mode, column_level) for sql in sqls]
+
+    merged = set()
+    for deps in results:
+        merged.update(deps)
+
+    dependency = ColumnDependency if column_level else TableDependency
+    return [dependency(dest, src) for dest, src in sorted(merged)]
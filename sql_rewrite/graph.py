@@ -14,6 +14,131 @@
 #
 
 
+from collections import Counter, deque
+
+
+def _index_graph(graph):
+    """Number the nodes of graph, returning (nodes, edges).
+
+    nodes lists every source and target once; edges[i] lists the indexes of
+    the targets of nodes[i].
+    """
+    nodes = list(graph)
+    index = {node: i for i, node in enumerate(nodes)}
+    for dests in graph.values():
+        for dest in dests:
+            if dest not in index:
+                index[dest] = len(nodes)
+                nodes.append(dest)
+    edges = [[index[dest] for dest in graph.get(node, ())] for node in nodes]
+    return nodes, edges
+
+
+def _components(edges):
+    """Strongly connected components of an indexed graph (Tarjan).
+
+    Iterative, so deep graphs do not exhaust the Python stack.
+
+    Returns: (component of each node, number of components). Components are
+    numbered in reverse topological order: if component a reaches component
+    b, then a > b.
+    """
+    n = len(edges)
+    comp = [-1] * n
+    num = [-1] * n
+    low = [0] * n
+    stack = []
+    counter = 0
+    ncomp = 0
+
+    for root in range(n):
+        if num[root] != -1:
+            continue
+
+        num[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        work = [(root, 0)]
+
+        while work:
+            v, i = work[-1]
+            if i < len(edges[v]):
+                work[-1] = (v, i + 1)
+                w = edges[v][i]
+                if num[w] == -1:
+                    num[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    work.append((w, 0))
+                elif comp[w] == -1:
+                    # Visited but unassigned -- w is still on the stack.
+                    low[v] = min(low[v], num[w])
+                continue
+
+            work.pop()
+            if work:
+                u = work[-1][0]
+                low[u] = min(low[u], low[v])
+
+            # v is the root of a component -- pop it off.
+            if low[v] == num[v]:
+                while True:
+                    w = stack.pop()
+                    comp[w] = ncomp
+                    if w == v:
+                        break
+                ncomp += 1
+
+    return comp, ncomp
+
+
+def _condense(edges, comp, ncomp):
+    """Successor components of each component, without self references."""
+    succs = [set() for _ in range(ncomp)]
+    for v, dests in enumerate(edges):
+        for w in dests:
+            if comp[v] != comp[w]:
+                succs[comp[v]].add(comp[w])
+    return succs
+
+
+def strongly_connected_components(graph):
+    """graph is a dictionary of <tuple> -> set(<tuple>)
+
+    Returns: list of components, each a list of nodes. Components are in
+    reverse topological order -- a component only depends on those before
+    it.
+    """
+
+    nodes, edges = _index_graph(graph)
+    comp, ncomp = _components(edges)
+
+    components = [[] for _ in range(ncomp)]
+    for v, c in enumerate(comp):
+        components[c].append(nodes[v])
+    return components
+
+
+def find_cycles(graph):
+    """Find the circular dependencies in graph.
+
+    A cycle is a strongly connected component of more than one node, or a
+    single node that depends on itself.
+
+    Returns: list of cycles, each a sorted list of nodes, largest first.
+    """
+
+    cycles = []
+    for component in strongly_connected_components(graph):
+        if len(component) > 1:
+            cycles.append(sorted(component))
+        elif component[0] in graph.get(component[0], ()):
+            cycles.append(component)
+
+    cycles.sort(key=lambda cycle: (-len(cycle), cycle))
+    return cycles
+
+
 def minimise_graph(graph):
     """graph is a dictionary of <tuple> -> set(<tuple>)
 
@@ -25,62 +150,235 @@ def minimise_graph(graph):
     The mapping for (1) will be simplified to (1) -> (3), as the
     2 target can be found through 3 -> 4, 4 -> 2.
 
+    Cycles are condensed into their strongly connected components: edges
+    within a component are kept, and edges between components are reduced
+    on the (acyclic) condensed graph, keeping every original edge that
+    realises a remaining component edge. Self-loops are dropped.
+
     Returns: graph
     """
 
-    # Exploded graph -- all connections direct and indirect
-    egraph = dict()
+    nodes, edges = _index_graph(graph)
+    comp, ncomp = _components(edges)
+    succs = _condense(edges, comp, ncomp)
 
-    # For each source, find all targets
-    def expand_all_source(src):
+    # Components are numbered sinks first, so the reachability of every
+    # successor is known by the time it is needed. reach[c] is a bitset of
+    # the components reachable from c.
+    reach = [0] * ncomp
+    kept = [None] * ncomp
+    for c in range(ncomp):
+        # A successor reachable through another successor is redundant. The
+        # successors that can reach others are numbered higher, so visit
+        # them first.
+        acc = 0
+        kept[c] = set()
+        for d in sorted(succs[c], reverse=True):
+            if not (acc >> d) & 1:
+                kept[c].add(d)
+                acc |= reach[d] | (1 << d)
+        reach[c] = acc
 
-        # Already found -- leave it alone.
-        if src in egraph:
+    # Now create the minimised set
+    mgraph = dict()
+    for v, dests in enumerate(edges):
+        children = {nodes[w] for w in dests
+                    if w != v and (comp[w] == comp[v] or
+                                   comp[w] in kept[comp[v]])}
+        if children:
+            mgraph[nodes[v]] = children
+
+    return mgraph
+
+
+def _bits(bitset):
+    """Indexes of the bits set in bitset, lowest first."""
+    digits = bin(bitset)[:1:-1]
+    i = digits.find('1')
+    while i >= 0:
+        yield i
+        i = digits.find('1', i + 1)
+
+
+def _edges(deps):
+    """(dest, src) pairs of a TableDependency list, without self-loops."""
+    return {(dest, src) for dep in deps
+            for dest in dep.dest for src in dep.src if src != dest}
+
+
+class ReachabilityIndex:
+    """Transitive dependencies of a graph, precomputed for fast queries.
+
+    graph is a dictionary of <tuple> -> set(<tuple>), as produced by
+    tables_to_graph: each table maps to the tables it is derived from.
+
+    The graph is condensed into strongly connected components and every
+    component holds a bitset of the components it depends on (upstream)
+    and of those that depend on it (downstream). Adding a dependency that
+    keeps the condensed graph acyclic updates the bitsets in place;
+    removing one, or closing a cycle, rebuilds the index on the next
+    query.
+
+    Each dependency counts the scripts that provide it (the dependencies
+    of graph count once) and only goes when none of them has it any more.
+    """
+
+    def __init__(self, graph):
+        self.graph = {dest: set(srcs) for dest, srcs in graph.items()}
+        self._count = {(dest, src): 1
+                       for dest, srcs in graph.items() for src in srcs}
+        self._build()
+
+    @classmethod
+    def from_scripts(cls, scripts):
+        """Index of several scripts, each a list of TableDependency."""
+        count = Counter(edge for deps in scripts for edge in _edges(deps))
+        graph = dict()
+        for dest, src in count:
+            graph.setdefault(dest, set()).add(src)
+        index = cls(graph)
+        index._count = dict(count)
+        return index
+
+    def _build(self):
+        self._nodes, edges = _index_graph(self.graph)
+        self._index = {node: v for v, node in enumerate(self._nodes)}
+        self._comp, ncomp = _components(edges)
+        succs = _condense(edges, self._comp, ncomp)
+
+        self._members = [[] for _ in range(ncomp)]
+        for v, c in enumerate(self._comp):
+            self._members[c].append(v)
+
+        # A component is upstream of itself only if it is a cycle.
+        cyclic = [1 << c if len(self._members[c]) > 1 else 0
+                  for c in range(ncomp)]
+        for v, dests in enumerate(edges):
+            if v in dests:
+                cyclic[self._comp[v]] = 1 << self._comp[v]
+
+        # Components are numbered sinks first -- dependencies before the
+        # components that use them.
+        self._up = [0] * ncomp
+        for c in range(ncomp):
+            acc = cyclic[c]
+            for d in succs[c]:
+                acc |= self._up[d] | (1 << d)
+            self._up[c] = acc
+
+        self._down = cyclic
+        for c in reversed(range(ncomp)):
+            for d in succs[c]:
+                self._down[d] |= self._down[c] | (1 << c)
+
+        self._dirty = False
+
+    def _ensure(self):
+        if self._dirty:
+            self._build()
+
+    def _node(self, table):
+        """Index of table, adding it as a component of its own if new."""
+        if table not in self._index:
+            c = len(self._members)
+            self._index[table] = len(self._nodes)
+            self._nodes.append(table)
+            self._comp.append(c)
+            self._members.append([self._index[table]])
+            self._up.append(0)
+            self._down.append(0)
+        return self._index[table]
+
+    def _tables(self, bitset):
+        return {self._nodes[v]
+                for c in _bits(bitset)
+                for v in self._members[c]}
+
+    def add_dependency(self, dest, src):
+        """Record that dest is derived from src (in one more script)."""
+        count = self._count.get((dest, src), 0)
+        self._count[(dest, src)] = count + 1
+        if count:
+            return
+        self.graph.setdefault(dest, set()).add(src)
+        if self._dirty:
             return
 
-        # Create the initial new set.
-        dest_set = set()
-        egraph[src] = dest_set
+        cd = self._comp[self._node(dest)]
+        cs = self._comp[self._node(src)]
 
-        # If there are no targets for it, there's
-        # nothing to expand..
-        if not src in graph:
+        # A new cycle merges components -- start again.
+        if cd == cs or (self._up[cs] >> cd) & 1:
+            self._dirty = True
             return
 
-        # Expand it as much as possible
-        for dest in graph[src]:
-            dest_set.add(dest)
-            expand_all_source(dest)
-            dest_set.update(egraph[dest])
+        # dest and everything downstream of it now depend on src and its
+        # upstream, and the other way round.
+        up = self._up[cs] | (1 << cs)
+        for c in _bits(self._down[cd] | (1 << cd)):
+            self._up[c] |= up
+        down = self._down[cd] | (1 << cd)
+        for c in _bits(self._up[cs] | (1 << cs)):
+            self._down[c] |= down
 
-        # In case there is a loop
-        dest_set.discard(src)
+    def remove_dependency(self, dest, src):
+        """Forget that dest is derived from src in one script."""
+        count = self._count.get((dest, src), 0)
+        if count > 1:
+            self._count[(dest, src)] = count - 1
+        elif count:
+            del self._count[(dest, src)]
+            self.graph[dest].discard(src)
+            self._dirty = True
 
-    # Create a set of direct and indirect targets
-    for src in graph:
-        expand_all_source(src)
+    def update(self, old_deps, new_deps):
+        """Replace the TableDependency list of a script with a new one."""
+        old = _edges(old_deps)
+        new = _edges(new_deps)
+        for dest, src in old - new:
+            self.remove_dependency(dest, src)
+        for dest, src in new - old:
+            self.add_dependency(dest, src)
 
-    # Now create the minimised set
-    mgraph = dict()
-    for src in egraph:
-        children = list(egraph[src])
-
-        # Want to iterate everything
-        i = 0
-        while i < len(children):
-            j = 0
-            while j < len(children):
-                if j != i:
-                    if (children[i] in egraph[children[j]] and
-                        egraph[children[i]].issubset(egraph[children[j]])):
-                        del children[i]
-                        i -= 1
-                        j = 0
-                        break
-                j += 1
-            i += 1
+    def upstream(self, table):
+        """Tables that table is derived from, directly or indirectly."""
+        self._ensure()
+        if table not in self._index:
+            return set()
+        return self._tables(self._up[self._comp[self._index[table]]])
 
-        if children:
-            mgraph[src] = set(children)
+    def downstream(self, table):
+        """Tables derived from table, directly or indirectly."""
+        self._ensure()
+        if table not in self._index:
+            return set()
+        return self._tables(self._down[self._comp[self._index[table]]])
 
-    return mgraph
+    def path(self, src, dest):
+        """Shortest chain of tables through which dest is derived from src.
+
+        Returns: list of tables from src to dest, or None.
+        """
+        self._ensure()
+        if src not in self._index or dest not in self._index:
+            return None
+        cs = self._comp[self._index[src]]
+        if not (self._up[self._comp[self._index[dest]]] >> cs) & 1:
+            return None
+
+        # Search back from dest, only through tables derived from src.
+        prev = {dest: None}
+        queue = deque([dest])
+        while queue:
+            table = queue.popleft()
+            for upper in self.graph.get(table, ()):
+                if upper == src:
+                    chain = [src, table]
+                    while prev[chain[-1]] is not None:
+                        chain.append(prev[chain[-1]])
+                    return chain
+                if (upper not in prev and
+                        (self._up[self._comp[self._index[upper]]] >> cs) & 1):
+                    prev[upper] = table
+                    queue.append(upper)
+        return None
@@ -0,0 +1,124 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from collections import namedtuple
+
+
+class Plan(namedtuple('Plan', ['after', 'waves', 'critical_path'])):
+    """Schedule for a sequence of statements.
+
+    after[i] is the sorted list of statements i has to wait for, waves the
+    statements that can run together (in order) and critical_path the
+    longest chain of statements that have to run one after the other.
+    """
+    pass
+
+
+def statement_order(deps):
+    """Ordering constraints between statements, given in script order.
+
+    deps is a list of TableDependency, one per statement. A statement
+    runs after the last writer of every table it reads (read after write),
+    and after the last writer and any later readers of every table it
+    writes (write after write, write after read).
+
+    Returns: list of sets of statement indexes.
+    """
+
+    last_writer = dict()
+    readers = dict()
+    after = []
+
+    for i, dep in enumerate(deps):
+        preds = set()
+        for table in dep.src:
+            if table in last_writer:
+                preds.add(last_writer[table])
+        for table in dep.dest:
+            if table in last_writer:
+                preds.add(last_writer[table])
+            preds.update(readers.get(table, ()))
+        preds.discard(i)
+        after.append(preds)
+
+        for table in dep.src:
+            readers.setdefault(table, set()).add(i)
+        for table in dep.dest:
+            last_writer[table] = i
+            readers[table] = set()
+
+    return after
+
+
+def plan(deps):
+    """Group statements into waves that can run concurrently.
+
+    Statements only depend on earlier ones, so a single pass in script order
+    gives each statement the earliest wave after all of its predecessors.
+
+    Returns: Plan
+    """
+
+    after = statement_order(deps)
+    wave = []
+    longest = []
+    for preds in after:
+        if preds:
+            # Keep the predecessor on the longest chain for the critical path
+            prev = max(preds, key=lambda p: (wave[p], -p))
+            wave.append(wave[prev] + 1)
+            longest.append(prev)
+        else:
+            wave.append(0)
+            longest.append(None)
+
+    waves = [[] for _ in range(max(wave) + 1 if wave else 0)]
+    for i, w in enumerate(wave):
+        waves[w].append(i)
+
+    critical_path = []
+    if waves:
+        i = waves[-1][0]
+        while i is not None:
+            critical_path.append(i)
+            i = longest[i]
+        critical_path.reverse()
+
+    return Plan([sorted(preds) for preds in after], waves, critical_path)
+
+
+def plan_to_json(deps, labels=None):
+    """The plan for deps as a JSON serialisable dictionary.
+
+    labels optionally names each statement (e.g. file and position); the
+    statement index is used otherwise.
+    """
+
+    result = plan(deps)
+    labels = labels or list(range(len(deps)))
+    return {
+        'statements': [
+            {
+                'id': labels[i],
+                'writes': list(dep.dest),
+                'reads': list(dep.src),
+                'after': [labels[p] for p in result.after[i]],
+            }
+            for i, dep in enumerate(deps)
+        ],
+        'waves': [[labels[i] for i in wave] for wave in result.waves],
+        'critical_path': [labels[i] for i in result.critical_path],
+    }
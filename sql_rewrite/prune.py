@@ -0,0 +1,84 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+
+class Liveness(namedtuple('Liveness', ['unread', 'dead_tables',
+                                       'dead_statements'])):
+    """Result of dead table analysis.
+
+    unread: tables written but never read and not published.
+    dead_tables: tables whose contents never reach a published table or a
+        statement that writes nothing (such as a final SELECT); includes
+        the unread tables.
+    dead_statements: indexes of the statements that only write dead tables.
+    """
+    pass
+
+
+def is_published(table, published):
+    """True if table matches one of the published names or glob patterns."""
+    return any(fnmatchcase(table, pattern) for pattern in published)
+
+
+def liveness(deps, published=()):
+    """Find the tables and statements that nothing uses.
+
+    deps is a list of TableDependency, one per statement, across every
+    script of the pipeline. A table is live if it is published or read by a
+    live statement; a statement is live if it writes a live table or writes
+    no table at all. Everything else is dead.
+
+    Returns: Liveness
+    """
+
+    writers = dict()
+    read = set()
+    for i, dep in enumerate(deps):
+        for table in dep.dest:
+            writers.setdefault(table, []).append(i)
+        read.update(dep.src)
+
+    live_tables = set()
+    live_statements = set()
+    work = [i for i, dep in enumerate(deps) if not dep.dest]
+
+    def mark(table):
+        if table not in live_tables:
+            live_tables.add(table)
+            work.extend(writers.get(table, ()))
+
+    for table in writers:
+        if is_published(table, published):
+            mark(table)
+
+    # Least fixpoint -- each statement and table is visited once.
+    while work:
+        i = work.pop()
+        if i in live_statements:
+            continue
+        live_statements.add(i)
+        for table in deps[i].src:
+            mark(table)
+
+    return Liveness(
+        sorted(table for table in writers
+               if table not in read and table not in live_tables),
+        sorted(table for table in writers if table not in live_tables),
+        [i for i in range(len(deps)) if i not in live_statements],
+    )
@@ -40,21 +40,17 @@ def tables(expr):
         return ops
 
     if isinstance(expr, SQLWithSelect):
+        for sql in expr.sqls:
+            ops.update(tables(sql))
         ops.update(tables(expr.select))
-        ops.difference_update(expr.tables)
+        # References to the common table expressions are not real tables.
+        ops.difference_update(TableOperation(str(table), False)
+                              for table in expr.tables)
         return ops
 
     if isinstance(expr, SQLScript):
-        for cmd in expr.commands:
-            dest = set()
-            src = set()
-            for table_op in tables(cmd):
-                if table_op.is_write:
-                    dest.add(table_op.table)
-                else:
-                    src.add(table_op.table)
-            if dest or src:
-                ops.add(TableDependency(tuple(dest), tuple(src)))
+        ops.update(dep for dep in statement_tables(expr)
+                   if dep.dest or dep.src)
         return ops
 
     if isinstance(expr, SQLNode):
@@ -64,7 +60,22 @@ def tables(expr):
     return ops
 
 
-def tables_to_graph(ops, minimise=True):
+def statement_tables(script):
+    """One TableDependency per command of script, in script order."""
+    deps = []
+    for cmd in script.commands:
+        dest = set()
+        src = set()
+        for table_op in tables(cmd):
+            if table_op.is_write:
+                dest.add(table_op.table)
+            else:
+                src.add(table_op.table)
+        deps.append(TableDependency(tuple(sorted(dest)), tuple(sorted(src))))
+    return deps
+
+
+def tables_to_graph(ops, minimise=True, self_loops=False):
 
     # Convert to a graph
     dgraph = dict()
@@ -73,7 +84,7 @@ def tables_to_graph(ops, minimise=True):
             if dest not in dgraph:
                 dgraph[dest] = set()
             for src in cmd.src:
-                if src != dest:
+                if self_loops or src != dest:
                     dgraph[dest].add(src)
 
     if minimise:
@@ -0,0 +1,120 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+import hashlib
+import sqlite3
+
+from .stats import TableDependency
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS deps (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    dest TEXT NOT NULL,
+    src TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deps_path ON deps(path);
+CREATE INDEX IF NOT EXISTS deps_dest ON deps(dest, src);
+CREATE INDEX IF NOT EXISTS deps_src ON deps(src, dest);
+'''
+
+# Walk the dependency rows from a table; UNION (rather than UNION ALL)
+# stops at tables already found, so cycles terminate.
+UPSTREAM = '''
+WITH RECURSIVE up(name) AS (
+    SELECT src FROM deps WHERE dest = ?
+    UNION
+    SELECT deps.src FROM deps JOIN up ON deps.dest = up.name
+)
+SELECT name FROM up ORDER BY name
+'''
+
+DOWNSTREAM = '''
+WITH RECURSIVE down(name) AS (
+    SELECT dest FROM deps WHERE src = ?
+    UNION
+    SELECT deps.dest FROM deps JOIN down ON deps.src = down.name
+)
+SELECT name FROM down ORDER BY name
+'''
+
+
+def digest(text):
+    """Content hash used to detect changed files."""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class LineageStore:
+    """Table dependencies of a set of SQL files, persisted in SQLite.
+
+    Each file is stored with the digest of its content, so only files that
+    changed since the last run need to be parsed again.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def is_current(self, path, file_digest):
+        row = self.conn.execute('SELECT digest FROM files WHERE path = ?',
+                                (path,)).fetchone()
+        return row is not None and row[0] == file_digest
+
+    def update(self, path, file_digest, deps):
+        """Replace the dependencies of path with deps (TableDependency).
+
+        A table that reads itself is kept as a self-loop, so that it is
+        reported as a cycle.
+        """
+        rows = {(path, dest, src)
+                for dep in deps
+                for dest in dep.dest
+                for src in dep.src}
+        with self.conn:
+            self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+            self.conn.execute('INSERT INTO files VALUES (?, ?)',
+                              (path, file_digest))
+            self.conn.executemany('INSERT INTO deps VALUES (?, ?, ?)',
+                                  sorted(rows))
+
+    def remove(self, path):
+        with self.conn:
+            self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+
+    def paths(self):
+        return [row[0] for row in
+                self.conn.execute('SELECT path FROM files ORDER BY path')]
+
+    def dependencies(self):
+        """All stored dependencies, one TableDependency per table pair."""
+        return {TableDependency((dest,), (src,)) for dest, src in
+                self.conn.execute('SELECT DISTINCT dest, src FROM deps')}
+
+    def upstream(self, table):
+        """Tables that table is derived from, directly or indirectly."""
+        return [row[0] for row in self.conn.execute(UPSTREAM, (table,))]
+
+    def downstream(self, table):
+        """Tables derived from table, directly or indirectly."""
+        return [row[0] for row in self.conn.execute(DOWNSTREAM, (table,))]
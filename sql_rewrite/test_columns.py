@@ -0,0 +1,68 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from sql_parser import parse
+
+from .columns import columns, ColumnDependency
+
+class TestColumns(unittest.TestCase):
+
+    def compare_columns(self, sql, expected):
+        self.assertEqual(
+            {dep.dest[0]: set(dep.src) for dep in columns(parse(sql))},
+            expected)
+
+    def test_create(self):
+        self.compare_columns(
+            '''CREATE TABLE d.out AS
+               SELECT t.a, b + c AS bc, UPPER(t.e), 1 AS one
+               FROM d.src AS t''',
+            {
+                'd.out.a': {'d.src.a'},
+                'd.out.bc': {'d.src.b', 'd.src.c'},
+                'd.out.f0_': {'d.src.e'},
+                'd.out.one': set(),
+            })
+
+    def test_cte(self):
+        self.compare_columns(
+            '''CREATE TABLE d.out AS
+               WITH x AS (SELECT a AS xa, b FROM d.src1),
+                    y AS (SELECT x.xa, z.c FROM x JOIN d.src2 z ON x.b = z.b)
+               SELECT y.* EXCEPT (c), xa AS again FROM y''',
+            {
+                'd.out.xa': {'d.src1.a'},
+                'd.out.again': {'d.src1.a'},
+            })
+
+    def test_insert_union(self):
+        self.compare_columns(
+            '''INSERT INTO d.out (p, q)
+               SELECT a, b FROM d.src1
+               UNION ALL
+               SELECT s.c, (SELECT MAX(m) FROM d.src3) FROM d.src2 s''',
+            {
+                'd.out.p': {'d.src1.a', 'd.src2.c'},
+                'd.out.q': {'d.src1.b', 'd.src3.m'},
+            })
+
+    def test_wildcard(self):
+        self.assertEqual(
+            columns(parse('INSERT INTO d.out SELECT * FROM d.src')),
+            {ColumnDependency(('d.out.*',), ('d.src.*',))})
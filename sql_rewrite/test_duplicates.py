@@ -0,0 +1,89 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from sql_parser import parse
+
+from .duplicates import fingerprint, queries, find_duplicates
+
+def query(sql):
+    return parse(sql).commands[0]
+
+class TestDuplicates(unittest.TestCase):
+
+    def test_fingerprint(self):
+        same = fingerprint(query(
+            'SELECT t.a, SUM(t.b) AS s FROM d.x AS t GROUP BY t.a'))
+        self.assertEqual(same, fingerprint(query(
+            '''-- comment
+               SELECT
+                 other.a,
+                 SUM(other.b) AS s
+               FROM d.x other
+               GROUP BY other.a''')))
+        self.assertNotEqual(same, fingerprint(query(
+            'SELECT t.a, SUM(t.b) AS s FROM d.y AS t GROUP BY t.a')))
+        self.assertNotEqual(same, fingerprint(query(
+            'SELECT t.a, SUM(t.c) AS s FROM d.x AS t GROUP BY t.a')))
+
+    def test_find_duplicates(self):
+        found = []
+        queries(parse('''
+            CREATE TABLE r1 AS
+            WITH w AS (SELECT o.id, o.v FROM d.o AS o WHERE o.v > 1)
+            SELECT * FROM w'''), 'one.sql', found)
+        queries(parse('''
+            SELECT s.id FROM (
+                SELECT p.id, p.v FROM d.o p WHERE p.v > 1) AS s'''),
+                'two.sql', found)
+
+        duplicates = find_duplicates(found, min_size=1)
+        self.assertEqual(len(duplicates), 1)
+        self.assertEqual(duplicates[0]['count'], 2)
+        self.assertEqual(duplicates[0]['reads'], ['d.o'])
+        self.assertEqual(
+            [(o['source'], o['kind'], o['name'])
+             for o in duplicates[0]['occurrences']],
+            [('one.sql', 'cte', 'w'), ('two.sql', 'subquery', 's')])
+        self.assertEqual(find_duplicates(found, min_size=1000), [])
+
+    def test_cte_references(self):
+        found = []
+        body = 'SELECT b.id FROM base AS b WHERE b.v > 1'
+        queries(parse('''
+            WITH base AS (SELECT id, v FROM d.x)
+            SELECT s.id FROM ({}) AS s'''.format(body)), 'x.sql', found)
+        queries(parse('''
+            WITH base AS (SELECT id, v FROM d.y)
+            SELECT s.id FROM ({}) AS s'''.format(body)), 'y.sql', found)
+        self.assertEqual(find_duplicates(found, min_size=1), [])
+
+        # Same definition under another name
+        queries(parse('''
+            WITH other AS (SELECT id, v FROM d.x)
+            SELECT s.id FROM (
+                SELECT b.id FROM other AS b WHERE b.v > 1) AS s'''),
+                'z.sql', found)
+        duplicates = find_duplicates(found, min_size=1)
+        self.assertEqual(
+            sorted([(o['source'], o['name']) for o in d['occurrences']]
+                   for d in duplicates),
+            [[('x.sql', 'base'), ('z.sql', 'other')],
+             [('x.sql', 's'), ('z.sql', 's')]])
+        self.assertEqual(sorted(d['reads'] for d in duplicates),
+                         [[], ['d.x']])
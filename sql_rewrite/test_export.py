@@ -0,0 +1,78 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import json
+import unittest
+from io import StringIO
+from xml.etree import ElementTree
+
+from .export import write_dot, write_jsonl, write_csr, write_graphml
+
+GRAPH = {
+    'c': {'a', 'b'},
+    'b': {'a'},
+    'd"q': set(),
+}
+
+def export(writer, graph=GRAPH):
+    outp = StringIO()
+    writer(outp, graph)
+    return outp.getvalue()
+
+class TestExport(unittest.TestCase):
+
+    def test_dot(self):
+        self.assertEqual(export(write_dot), '\n'.join([
+            'digraph connections {',
+            '"b" -> "a";',
+            '"c" -> "a";',
+            '"c" -> "b";',
+            '}',
+            '',
+        ]))
+
+    def test_jsonl(self):
+        lines = [json.loads(line)
+                 for line in export(write_jsonl).splitlines()]
+        self.assertEqual(lines, [
+            {'id': 0, 'name': 'a'},
+            {'id': 1, 'name': 'b'},
+            {'id': 2, 'name': 'c'},
+            {'id': 3, 'name': 'd"q'},
+            {'dest': 1, 'src': 0},
+            {'dest': 2, 'src': 0},
+            {'dest': 2, 'src': 1},
+        ])
+
+    def test_csr(self):
+        self.assertEqual(json.loads(export(write_csr)), {
+            'nodes': ['a', 'b', 'c', 'd"q'],
+            'indptr': [0, 0, 1, 3, 3],
+            'indices': [0, 0, 1],
+        })
+        self.assertEqual(json.loads(export(write_csr, {})), {
+            'nodes': [], 'indptr': [0], 'indices': [],
+        })
+
+    def test_graphml(self):
+        ns = '{http://graphml.graphdrawing.org/xmlns}'
+        root = ElementTree.fromstring(export(write_graphml, {'x<': {'y'}}))
+        graph = root.find(ns + 'graph')
+        self.assertEqual([node.find(ns + 'data').text
+                          for node in graph.iter(ns + 'node')], ['x<', 'y'])
+        self.assertEqual([edge.attrib for edge in graph.iter(ns + 'edge')],
+                         [{'source': 'n0', 'target': 'n1'}])
@@ -0,0 +1,46 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from .extract import extract
+from .stats import TableDependency
+
+SQLS = [
+    'INSERT INTO b SELECT x FROM a; INSERT INTO c SELECT x FROM b',
+    'INSERT INTO d SELECT x FROM c',
+    'INSERT INTO b SELECT x FROM a',
+]
+
+class TestExtract(unittest.TestCase):
+
+    def test_extract(self):
+        expected = [
+            TableDependency(('b',), ('a',)),
+            TableDependency(('c',), ('b',)),
+            TableDependency(('d',), ('c',)),
+        ]
+        self.assertEqual(extract(SQLS), expected)
+        self.assertEqual(extract(SQLS, jobs=2), expected)
+
+    def test_extract_columns(self):
+        deps = extract(SQLS, column_level=True, jobs=2)
+        self.assertEqual([(dep.dest, dep.src) for dep in deps], [
+            (('b.x',), ('a.x',)),
+            (('c.x',), ('b.x',)),
+            (('d.x',), ('c.x',)),
+        ])
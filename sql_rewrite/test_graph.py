@@ -16,7 +16,9 @@
 
 import unittest
 
-from .graph import minimise_graph
+from .graph import (minimise_graph, strongly_connected_components, find_cycles,
+                    ReachabilityIndex)
+from .stats import TableDependency
 
 class TestGraph(unittest.TestCase):
 
@@ -36,3 +38,105 @@ class TestGraph(unittest.TestCase):
                 'c': {'d', 'f'},
             },
         )
+
+    def test_graph_diamond(self):
+        self.compare_graph(
+            {
+                'a': {'b', 'c', 'd'},
+                'b': {'d'},
+                'c': {'d'},
+                'd': set(),
+            },
+            {
+                'a': {'b', 'c'},
+                'b': {'d'},
+                'c': {'d'},
+            },
+        )
+
+    def test_graph_cycle(self):
+        self.compare_graph(
+            {
+                'a': {'b', 'd'},
+                'b': {'c'},
+                'c': {'a', 'b', 'd'},
+                'd': {'d', 'e'},
+                'x': {'a', 'c', 'e'},
+            },
+            {
+                'a': {'b', 'd'},
+                'b': {'c'},
+                'c': {'a', 'b', 'd'},
+                'd': {'e'},
+                'x': {'a', 'c'},
+            },
+        )
+
+    def test_graph_deep(self):
+        chain = {i: {i + 1, i + 2} for i in range(50000)}
+        chain[50000] = {50001}
+        expected = {i: {i + 1} for i in range(50001)}
+        self.compare_graph(chain, expected)
+
+    def test_components(self):
+        components = strongly_connected_components({
+            'a': {'b'},
+            'b': {'c', 'd'},
+            'c': {'b'},
+        })
+        self.assertEqual([sorted(c) for c in components],
+                         [['d'], ['b', 'c'], ['a']])
+
+    def test_cycles(self):
+        self.assertEqual(
+            find_cycles({
+                'a': {'b'},
+                'b': {'a', 'c'},
+                'c': {'c', 'd'},
+                'd': {'e'},
+                'e': {'f'},
+                'f': {'d'},
+            }),
+            [['d', 'e', 'f'], ['a', 'b'], ['c']],
+        )
+        self.assertEqual(find_cycles({'a': {'b', 'c'}, 'b': {'c'}}), [])
+
+    def test_reachability(self):
+        index = ReachabilityIndex({
+            'c': {'a', 'b'},
+            'd': {'c'},
+            'e': {'b'},
+        })
+        self.assertEqual(index.upstream('d'), {'a', 'b', 'c'})
+        self.assertEqual(index.downstream('b'), {'c', 'd', 'e'})
+        self.assertEqual(index.upstream('a'), set())
+        self.assertEqual(index.path('a', 'd'), ['a', 'c', 'd'])
+        self.assertIsNone(index.path('d', 'a'))
+        self.assertIsNone(index.path('x', 'a'))
+
+        index.add_dependency('f', 'd')
+        self.assertEqual(index.downstream('a'), {'c', 'd', 'f'})
+
+        # Closing a cycle
+        index.add_dependency('a', 'f')
+        self.assertEqual(index.upstream('a'), {'a', 'b', 'c', 'd', 'f'})
+        self.assertEqual(index.path('d', 'c'), ['d', 'f', 'a', 'c'])
+
+        index.remove_dependency('c', 'a')
+        self.assertEqual(index.downstream('a'), set())
+        self.assertEqual(index.upstream('d'), {'b', 'c'})
+
+    def test_reachability_scripts(self):
+        first = [TableDependency(('c',), ('a',))]
+        second = [TableDependency(('c',), ('a', 'b')),
+                  TableDependency(('d',), ('c',))]
+        index = ReachabilityIndex.from_scripts([first, second])
+        self.assertEqual(index.upstream('d'), {'a', 'b', 'c'})
+
+        # c <- a is still provided by the second script
+        index.update(first, [])
+        self.assertEqual(index.upstream('c'), {'a', 'b'})
+
+        index.update(second, [TableDependency(('d',), ('c',))])
+        self.assertEqual(index.upstream('d'), {'c'})
+        self.assertEqual(index.downstream('a'), set())
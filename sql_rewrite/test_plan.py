@@ -0,0 +1,59 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from .stats import TableDependency
+from .plan import plan, plan_to_json
+
+def dep(dest, *src):
+    return TableDependency((dest,), src)
+
+class TestPlan(unittest.TestCase):
+
+    def test_hazards(self):
+        result = plan([
+            dep('a', 's1'),
+            dep('b', 's2'),
+            dep('c', 'a', 'b'),     # reads after writes of a and b
+            dep('s1', 'x'),         # writes after the read of s1
+            dep('a', 's2'),         # writes after the write and read of a
+            dep('d', 'c'),
+        ])
+        self.assertEqual(result.after, [[], [], [0, 1], [0], [0, 2], [2]])
+        self.assertEqual(result.waves, [[0, 1], [2, 3], [4, 5]])
+        self.assertEqual(result.critical_path, [0, 2, 4])
+
+    def test_self_reference(self):
+        result = plan([dep('a', 'a'), dep('a', 'a'), dep('b', 'c')])
+        self.assertEqual(result.after, [[], [0], []])
+        self.assertEqual(result.waves, [[0, 2], [1]])
+
+    def test_json(self):
+        self.assertEqual(
+            plan_to_json([dep('a', 'x'), dep('b', 'a')], ['f:1', 'f:2']),
+            {
+                'statements': [
+                    {'id': 'f:1', 'writes': ['a'], 'reads': ['x'],
+                     'after': []},
+                    {'id': 'f:2', 'writes': ['b'], 'reads': ['a'],
+                     'after': ['f:1']},
+                ],
+                'waves': [['f:1'], ['f:2']],
+                'critical_path': ['f:1', 'f:2'],
+            })
+        self.assertEqual(plan_to_json([])['waves'], [])
@@ -0,0 +1,48 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from .stats import TableDependency
+from .prune import liveness
+
+def dep(dest, *src):
+    return TableDependency((dest,) if dest else (), src)
+
+class TestPrune(unittest.TestCase):
+
+    def test_liveness(self):
+        result = liveness([
+            dep('tmp1', 'src'),
+            dep('tmp2', 'tmp1'),
+            dep('unused', 'tmp1'),
+            dep('chain', 'unused'),
+            dep('out.final', 'tmp2'),
+            dep('scratch', 'src'),
+            dep(None, 'scratch'),
+        ], ['out.*'])
+        self.assertEqual(result.unread, ['chain'])
+        self.assertEqual(result.dead_tables, ['chain', 'unused'])
+        self.assertEqual(result.dead_statements, [2, 3])
+
+    def test_cycle(self):
+        # Tables that only feed each other are dead.
+        result = liveness([dep('a', 'b'), dep('b', 'a'), dep('c', 'src')],
+                          ['c'])
+        self.assertEqual(result.unread, [])
+        self.assertEqual(result.dead_tables, ['a', 'b'])
+        self.assertEqual(result.dead_statements, [0, 1])
@@ -0,0 +1,66 @@
+# Copyright 2020 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest
+
+from .stats import TableDependency
+from .store import LineageStore, digest
+
+class TestLineageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = LineageStore(':memory:')
+        self.store.update('a.sql', digest('a'), {
+            TableDependency(('b',), ('a',)),
+            TableDependency(('c',), ('b', 'x')),
+        })
+        self.store.update('b.sql', digest('b'), {
+            TableDependency(('d',), ('c',)),
+            TableDependency(('a',), ('d',)),
+        })
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_current(self):
+        self.assertTrue(self.store.is_current('a.sql', digest('a')))
+        self.assertFalse(self.store.is_current('a.sql', digest('changed')))
+        self.assertFalse(self.store.is_current('new.sql', digest('a')))
+
+    def test_queries(self):
+        self.assertEqual(self.store.upstream('c'), ['a', 'b', 'c', 'd', 'x'])
+        self.assertEqual(self.store.downstream('x'), ['a', 'b', 'c', 'd'])
+        self.assertEqual(self.store.upstream('x'), [])
+
+    def test_update(self):
+        self.store.update('b.sql', digest('b2'), {
+            TableDependency(('d',), ('c',)),
+        })
+        self.assertEqual(self.store.upstream('c'), ['a', 'b', 'x'])
+        self.store.remove('a.sql')
+        self.assertEqual(self.store.paths(), ['b.sql'])
+        self.assertEqual(self.store.dependencies(),
+                         {TableDependency(('d',), ('c',))})
+
+    def test_self_loop(self):
+        self.store.update('c.sql', digest('c'), {
+            TableDependency(('e',), ('e', 'a')),
+        })
+        self.assertEqual(self.store.upstream('e'), ['a', 'b', 'c', 'd', 'e',
+                                                    'x'])
+        self.assertIn(TableDependency(('e',), ('e',)),
+                      self.store.dependencies())
@@ -0,0 +1,90 @@
+
+import os
+import sys
+import tempfile
+from io import StringIO
+
+# directory reach
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# setting path
+sys.path.append(directory)
+
+import unittest
+from sql_refactor import refactor_text, refactor_stream, impact_text
+from sql_refactor.batch import (refactor_all, refactor_to, impact_all,
+                                impact_report)
+from sql_refactor.knowledge import compile_knowledge
+
+KNOWLEDGE = {
+    'table_a': {
+        'new_table': 'new_table_a',
+        'column_knowledge': {'column_1': 'new_column_1'},
+        'preserved': False,
+    },
+}
+
+CREATE = '''DECLARE x INT64;
+CREATE TABLE table_x AS SELECT column_1 AS c FROM table_a;
+SELECT c FROM table_x'''
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        compile_knowledge(KNOWLEDGE, self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_refactor_text_isolated(self):
+        first = refactor_text(CREATE, KNOWLEDGE)
+        self.assertEqual(first, refactor_text(CREATE, KNOWLEDGE))
+        self.assertEqual(first.count('DECLARE'), 1)
+        self.assertEqual(sorted(KNOWLEDGE), ['table_a'])
+
+        # table_x was only known to the script that created it
+        self.assertIn('Could not find table in knowledge: table_x',
+                      refactor_text('SELECT c FROM table_x', KNOWLEDGE))
+
+    def test_refactor_all(self):
+        sqls = ['SELECT column_1 FROM table_a', 'SELECT FROM ((', CREATE]
+        serial = refactor_all(sqls, self.path)
+        self.assertEqual(serial, refactor_all(sqls, self.path, jobs=2))
+
+        self.assertEqual(serial[0], (refactor_text(sqls[0], KNOWLEDGE), None))
+        self.assertIsNone(serial[1][0])
+        self.assertTrue(serial[1][1].startswith('ParsingError'))
+        self.assertEqual(serial[2], (refactor_text(CREATE, KNOWLEDGE), None))
+
+    def test_refactor_stream(self):
+        outp = StringIO()
+        self.assertTrue(refactor_stream(CREATE, KNOWLEDGE, outp))
+        self.assertEqual(outp.getvalue(), refactor_text(CREATE, KNOWLEDGE))
+
+        # The statements before the error are written
+        outp = StringIO()
+        result, error = refactor_to(outp, 'SELECT column_1 FROM table_a;\n'
+                                    'SELECT FROM ((', KNOWLEDGE)
+        self.assertIsNone(result)
+        self.assertTrue(error.startswith('ParsingError'))
+        self.assertEqual(outp.getvalue(), refactor_text(
+            'SELECT column_1 FROM table_a', KNOWLEDGE))
+
+    def test_impact(self):
+        sqls = [CREATE, 'SELECT 1', 'SELECT FROM ((']
+        results = impact_all(sqls, self.path)
+        self.assertEqual(results, impact_all(sqls, self.path, jobs=2))
+        self.assertEqual(results[0], (impact_text(CREATE, KNOWLEDGE), None))
+        self.assertEqual(results[1], ([], None))
+
+        report = impact_report(['create.sql', 'one.sql', 'bad.sql'], results)
+        self.assertEqual([f['file'] for f in report['files']],
+                         ['create.sql', 'bad.sql'])
+        self.assertEqual([s['lines'] for s in report['files'][0]['statements']],
+                         [[2, 2]])
+        self.assertTrue(report['files'][1]['error'].startswith('ParsingError'))
+        self.assertEqual(report['tables'], {'table_a': 'new_table_a'})
+        self.assertEqual(report['columns'], {'table_a.column_1': 'new_column_1'})
+        self.assertEqual(report['casts'], {})
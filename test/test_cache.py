@@ -0,0 +1,105 @@
+
+import copy
+import os
+import sys
+import tempfile
+
+# directory reach
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# setting path
+sys.path.append(directory)
+
+import unittest
+from sql_refactor import refactor_text
+from sql_refactor.batch import refactor_all
+from sql_refactor.cache import RefactorCache, statement_key
+from sql_refactor.knowledge import compile_knowledge
+
+KNOWLEDGE = {
+    'table_a': {
+        'new_table': 'new_table_a',
+        'column_knowledge': {'column_1': 'new_column_1'},
+        'preserved': False,
+    },
+    'table_b': {
+        'new_table': 'new_table_b',
+        'column_knowledge': {'column_2': 'new_column_2'},
+        'preserved': False,
+    },
+}
+
+SQL = '''CREATE TABLE table_x AS SELECT column_1 AS c FROM table_a;
+SELECT c FROM table_x;
+SELECT column_2 FROM table_b;
+SELECT column_3 FROM table_c'''
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def refactor(self, knowledge):
+        cache = RefactorCache(self.path)
+        result = refactor_text(SQL, knowledge, cache=cache)
+        cache.close()
+        self.assertEqual(result, refactor_text(SQL, knowledge))
+        return cache.hits, cache.misses
+
+    def test_statement_key(self):
+        self.assertEqual(statement_key('SELECT a,\n    b  FROM t '),
+                         statement_key('  SELECT a,\nb FROM t'))
+        self.assertNotEqual(statement_key("SELECT 'a  b'"),
+                            statement_key("SELECT 'a b'"))
+        self.assertNotEqual(statement_key("SELECT 1 -- it's\n, 'a  b'"),
+                            statement_key("SELECT 1 -- it's\n, 'a b'"))
+        self.assertNotEqual(statement_key('SELECT a FROM t'),
+                            statement_key('SELECT a FROM t', True))
+
+    def test_invalidation(self):
+        self.assertEqual(self.refactor(KNOWLEDGE), (0, 4))
+
+        # table_x is known from the cached CREATE
+        self.assertEqual(self.refactor(KNOWLEDGE), (4, 0))
+
+        knowledge = copy.deepcopy(KNOWLEDGE)
+        knowledge['table_b']['column_knowledge']['column_2'] = 'column_2b'
+        self.assertEqual(self.refactor(knowledge), (3, 1))
+
+        # A table that was not found before
+        knowledge['table_c'] = {
+            'new_table': 'new_table_c',
+            'column_knowledge': {'column_3': 'column_3c'},
+            'preserved': False,
+        }
+        self.assertEqual(self.refactor(knowledge), (3, 1))
+
+        # table_x still has the same columns, so the SELECT from it is kept
+        knowledge['table_a']['column_knowledge']['column_1'] = 'column_1a'
+        self.assertEqual(self.refactor(knowledge), (3, 1))
+
+    def test_semicolon_in_string(self):
+        sql = "SELECT 'a;b' AS x, column_1 FROM table_a"
+        for expected in ((0, 1), (1, 0)):
+            cache = RefactorCache(self.path)
+            result = refactor_text(sql, KNOWLEDGE, cache=cache)
+            cache.close()
+            self.assertEqual(result, refactor_text(sql, KNOWLEDGE))
+            self.assertEqual((cache.hits, cache.misses), expected)
+
+    def test_refactor_all_stats(self):
+        fd, knowledge_path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        try:
+            compile_knowledge(KNOWLEDGE, knowledge_path)
+            for jobs, expected in ((2, (0, 4)), (2, (4, 0)), (1, (4, 0))):
+                stats = dict()
+                refactor_all(SQL.split(';'), knowledge_path, jobs,
+                             cache_path=self.path, stats=stats)
+                self.assertEqual((stats['hits'], stats['misses']), expected)
+        finally:
+            os.remove(knowledge_path)
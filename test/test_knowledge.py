@@ -0,0 +1,82 @@
+
+import os
+import sys
+import tempfile
+
+# directory reach
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# setting path
+sys.path.append(directory)
+
+import unittest
+from sql_refactor import Refactor
+from sql_refactor.knowledge import (compile_knowledge, load_knowledge,
+                                    validate, KnowledgeError, KnowledgeFile)
+
+KNOWLEDGE = {
+    'table_a': {
+        'new_table': 'new_table_a',
+        'column_knowledge': {'column_1': 'new_column_1'},
+        'column_type_knowledge': {'column_1': 'INTEGER'},
+        'preserved': False,
+    },
+    'täble_b': {
+        'new_table': None,
+        'column_knowledge': {'column_1': None},
+        'preserved': True,
+    },
+    'table_c': {
+        'new_table': 'new_table_c',
+        'column_knowledge': {},
+        'preserved': False,
+    },
+}
+
+class TestKnowledge(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.bin')
+        os.close(fd)
+        compile_knowledge(KNOWLEDGE, self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_validate(self):
+        validate(KNOWLEDGE)
+        with self.assertRaises(KnowledgeError):
+            validate({'t': {'new_table': None, 'preserved': True}})
+        with self.assertRaises(KnowledgeError):
+            validate({'t': {'new_table': None, 'column_knowledge': {},
+                            'preserved': 'yes'}})
+        with self.assertRaises(KnowledgeError):
+            validate({'t': {'new_table': None, 'column_knowledge': {'a': 1},
+                            'preserved': True}})
+
+    def test_load_invalid(self):
+        with open(self.path, 'w') as outp:
+            outp.write('{"table_a": ')
+        with self.assertRaisesRegex(KnowledgeError, 'not valid JSON'):
+            load_knowledge(self.path)
+        with open(self.path, 'w') as outp:
+            outp.write('{"table_a": {"new_table": null}}')
+        with self.assertRaisesRegex(KnowledgeError, 'table_a: missing'):
+            load_knowledge(self.path)
+
+    def test_compiled(self):
+        knowledge = load_knowledge(self.path)
+        self.assertIsInstance(knowledge, KnowledgeFile)
+        self.assertEqual(sorted(knowledge), sorted(KNOWLEDGE))
+        self.assertEqual(dict(knowledge), KNOWLEDGE)
+        self.assertNotIn('table_x', knowledge)
+        self.assertNotIn('', knowledge)
+        self.assertIs(knowledge['table_a'], knowledge['table_a'])
+
+    def test_refactor_compiled(self):
+        command = Refactor(load_knowledge(self.path))
+        command.refactor('SELECT column_1 FROM table_a')
+        self.assertEqual(
+            command.result().split(),
+            ['SELECT', 'CAST(new_column_1', 'AS', 'INTEGER)', 'AS',
+             'column_1', 'FROM', '`new_table_a`'])
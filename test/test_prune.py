@@ -0,0 +1,50 @@
+
+import os
+import sys
+import tempfile
+import shutil
+
+# directory reach
+directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# setting path
+sys.path.append(directory)
+
+import unittest
+import sql
+from sql_parser import parse
+from sql_parser import PROFILE
+
+SCRIPT = '''CREATE TABLE d.a AS SELECT x FROM d.src;
+CREATE TABLE d.unused AS SELECT x FROM d.a;
+CREATE TABLE d.b AS SELECT x FROM d.a;
+CREATE TABLE d.out AS SELECT x FROM d.b'''
+
+class TestPrune(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'in', 'script.sql')
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as outp:
+            outp.write(SCRIPT)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_prune_script(self):
+        output_dir = os.path.join(self.directory, 'out')
+        args = sql.argparser.parse_args([
+            '--prune', '--publish', 'd.out', '--output_dir', output_dir,
+            self.path])
+        sql.prune(args, PROFILE)
+        for sql_input in args.sql_input:
+            sql_input.close()
+
+        with open(os.path.join(output_dir, 'script.sql')) as inp:
+            pruned = inp.read()
+        self.assertEqual(pruned.count(';'), 2)
+        self.assertEqual(
+            [str(cmd) for cmd in parse(pruned).commands],
+            [str(cmd) for i, cmd in enumerate(parse(SCRIPT).commands)
+             if i != 1])
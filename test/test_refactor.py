@@ -9,6 +9,7 @@ directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 sys.path.append(directory)
 
 import unittest
+from sql_parser import parse
 from sql_refactor import Refactor
 
 class TestRefactor(unittest.TestCase):
@@ -76,6 +77,7 @@ class TestRefactor(unittest.TestCase):
                             'preserved' : False
                         },
                     }
+        self.knowledge = knowledge
         self.command = Refactor(knowledge)
 
     def _assert_equal_sql(self, sql, reference):
@@ -577,3 +579,208 @@ class TestRefactor(unittest.TestCase):
         """
 
         self._assert_equal_sql(sql, reference)
+
+    def test_cte_shadows_table(self):
+        sql = """
+        WITH table_a AS (
+            SELECT column_1
+            FROM table_b
+        )
+        SELECT column_1
+        FROM table_a
+        """
+
+        reference = """
+        WITH table_a AS (
+            SELECT new_column_1b AS column_1
+            FROM new_table_b
+        )
+        SELECT column_1
+        FROM table_a
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+        # The CTE goes out of scope with its query
+        self.test_simple_select()
+
+    def test_knowledge_not_modified(self):
+        knowledge = {
+            'table_a': {
+                'new_table': 'new_table_a',
+                'column_knowledge': {'column_1': 'new_column_1'},
+                'preserved': False,
+            },
+        }
+        command = Refactor(knowledge)
+        command.refactor("""
+        CREATE TABLE table_x AS
+        WITH t AS (SELECT column_1 FROM table_a)
+        SELECT column_1 FROM (SELECT column_1 FROM t) AS s
+        """)
+        self.assertEqual(list(knowledge), ['table_a'])
+        self.assertEqual(knowledge['table_a']['column_knowledge'],
+                         {'column_1': 'new_column_1'})
+
+    def test_alias_reused_across_selects(self):
+        sql = """
+        SELECT s.column_1 FROM (SELECT column_1 FROM table_a) AS s
+        UNION ALL
+        SELECT s.column_2b FROM (SELECT column_2b FROM table_b) AS s
+        """
+
+        reference = """
+        SELECT s.column_1 FROM (SELECT new_column_1 AS column_1 FROM new_table_a) AS s
+        UNION ALL
+        SELECT s.column_2b FROM (SELECT new_column_2b AS column_2b FROM new_table_b) AS s
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+    def test_prune_wildcards(self):
+        self.command = Refactor(self.knowledge, prune_wildcards=True)
+
+        sql = """
+        WITH t AS (SELECT * FROM table_a),
+        u AS (SELECT * FROM table_b)
+        SELECT a.column_2, x.column_1
+        FROM t AS a JOIN (SELECT * EXCEPT(column_2) FROM table_a) AS x
+        ON a.column_1 = x.column_1
+        CROSS JOIN u
+        """
+
+        reference = """
+        WITH t AS (SELECT new_column_1 AS column_1, new_column_2 AS column_2 FROM new_table_a),
+        u AS (SELECT new_column_1b AS column_1 FROM new_table_b)
+        SELECT a.column_2, x.column_1
+        FROM t AS a JOIN (SELECT new_column_1 AS column_1 FROM new_table_a) AS x
+        ON a.column_1 = x.column_1
+        CROSS JOIN u
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+        # Read by a wildcard, so every column is kept
+        sql = """
+        WITH t AS (SELECT * FROM table_a)
+        SELECT * FROM t
+        """
+
+        reference = """
+        WITH t AS (SELECT new_column_1 AS column_1, new_column_2 AS column_2,
+        new_column_3 AS column_3 FROM new_table_a)
+        SELECT column_1, column_2, column_3 FROM t
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+    def test_prune_wildcards_order_by(self):
+        self.command = Refactor(self.knowledge, prune_wildcards=True)
+
+        # ORDER BY reads the columns of the SELECT it orders
+        sql = """
+        SELECT x.column_2 FROM (SELECT * FROM table_a) AS x
+        ORDER BY x.column_3 LIMIT 5
+        """
+
+        reference = """
+        SELECT x.column_2 FROM (SELECT new_column_2 AS column_2,
+        new_column_3 AS column_3 FROM new_table_a) AS x
+        ORDER BY x.column_3 LIMIT 5
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+        sql = """
+        WITH t AS (SELECT * FROM table_a)
+        SELECT column_2 FROM t ORDER BY column_3
+        """
+
+        reference = """
+        WITH t AS (SELECT new_column_2 AS column_2, new_column_3 AS column_3
+        FROM new_table_a)
+        SELECT column_2 FROM t ORDER BY column_3
+        """
+
+        self._assert_equal_sql(sql, reference)
+
+    def test_prune_wildcards_correlated(self):
+        self.command = Refactor(self.knowledge, prune_wildcards=True)
+
+        # column_3 is a column of w, not of the tables of the subquery
+        for tables in ('table_b d', 'table_b d CROSS JOIN table_c c'):
+            sql = """
+            WITH w AS (SELECT * FROM table_e)
+            SELECT w.column_0 FROM w
+            WHERE EXISTS (SELECT 1 FROM {} WHERE d.column_1b = column_3)
+            """.format(tables)
+
+            self.command.refactor(sql)
+            cte = self.command.result().split('SELECT\n  column_0')[0]
+            self.assertIn('new_column_0 AS column_0', cte)
+            self.assertIn('AS column_3', cte)
+
+    def test_compiled_knowledge_released(self):
+        command = Refactor(self.knowledge)
+        command.refactor("""
+        WITH t AS (SELECT column_1 FROM table_a)
+        SELECT column_1 FROM (SELECT column_1 FROM t) AS s;
+        CREATE TABLE table_x AS SELECT column_1 FROM table_a;
+        SELECT column_1 FROM table_x
+        """)
+        # Only the maps of the base knowledge and the session are left
+        self.assertEqual(len(command._compiled), 2)
+        self.assertEqual(list(command._compiled[-1]), ['table_a'])
+        self.assertEqual(list(command._compiled[-2]), ['table_x'])
+
+        command.refactor('SELECT column_1 FROM table_a')
+        self.assertEqual(command._compiled[-2], {})
+
+    def test_parsed_tree_not_modified(self):
+        parsed = parse("""
+        WITH t AS (SELECT column_1, column_3 FROM table_a)
+        SELECT t.*, b.column_1 FROM t JOIN table_b AS b USING (column_1)
+        WHERE b.column_2b > 0
+        """)
+        before = parsed.as_sql()
+
+        command = Refactor(self.knowledge)
+        first = command.rewrite(parsed)
+        self.assertEqual(parsed.as_sql(), before)
+        self.assertNotEqual(first.as_sql(), before)
+
+        # The same tree can be refactored again, with the same result
+        self.assertEqual(command.rewrite(parsed).as_sql(), first.as_sql())
+
+    def test_impact(self):
+        sql = """
+        SELECT a.column_1, b.column_2b
+        FROM table_a AS a
+        JOIN table_b AS b ON a.column_3 = b.column_1;
+
+        SELECT column_1 FROM table_d;
+        SELECT column_9 FROM table_a;
+        SELECT column_1 FROM table_e
+        """
+
+        command = Refactor(self.knowledge)
+        report = command.impact(sql)
+        self.assertEqual([(s['statement'], s['lines']) for s in report],
+                         [(1, [2, 4]), (3, [7, 7]), (4, [8, 8])])
+        self.assertEqual(report[0]['changes'], [
+            {'kind': 'table', 'old': 'table_a', 'new': 'new_table_a'},
+            {'kind': 'table', 'old': 'table_b', 'new': 'new_table_b'},
+            {'kind': 'column', 'table': 'table_a', 'old': 'column_3', 'new': 'new_column_3'},
+            {'kind': 'column', 'table': 'table_b', 'old': 'column_1', 'new': 'new_column_1b'},
+            {'kind': 'column', 'table': 'table_a', 'old': 'column_1', 'new': 'new_column_1'},
+            {'kind': 'column', 'table': 'table_b', 'old': 'column_2b', 'new': 'new_column_2b'},
+        ])
+        self.assertEqual(report[1]['changes'], [
+            {'kind': 'table', 'old': 'table_a', 'new': 'new_table_a'},
+            {'kind': 'column_not_found', 'tables': ['table_a'], 'column': 'column_9'},
+        ])
+        self.assertEqual(report[2]['changes'], [
+            {'kind': 'table', 'old': 'table_e', 'new': 'new_table_e'},
+            {'kind': 'column', 'table': 'table_e', 'old': 'column_1', 'new': 'new_column_1'},
+            {'kind': 'cast', 'table': 'table_e', 'column': 'column_1', 'type': 'INTEGER'},
+        ])